@@ -0,0 +1,482 @@
+# -*- coding: utf-8 -*-
+"""
+性能基准测试
+用法: python benchmark.py kline-upsert [--rows 1000000]
+      python benchmark.py catalog-startup [--items 28000]
+      python benchmark.py catalog-ingest [--items 28000]
+      python benchmark.py indicators [--items 5000 --days 365]
+      python benchmark.py beta [--items 28000 --days 180]
+      python benchmark.py latest-price [--rows 10000000 --items 2000]
+      python benchmark.py spread-scan [--items 28000]
+      python benchmark.py full-capture [--items 28000 --polls 10 --change-rate 0.05]
+所有测试都在临时目录中的数据库上进行，不会改动项目中的数据库文件。
+"""
+import argparse
+import itertools
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+import database_setup
+import get_all_items
+import get_kline
+import get_prices
+import get_market_index
+import indicators
+import item_catalog
+import market_beta
+import spread_scanner
+import storage
+
+DAY_SECONDS = 86400
+BASE_TIMESTAMP = 1735488000  # 2025.1.1 北京时间0点
+
+
+def generate_kline_rows(total_rows: int, days_per_item: int = 365) -> List[List[Tuple]]:
+    """生成按物品分组的合成日K线数据，每个物品 days_per_item 根"""
+    items = []
+    item_count = (total_rows + days_per_item - 1) // days_per_item
+    remaining = total_rows
+    for i in range(item_count):
+        name = f"Synthetic Item {i:06d}"
+        days = min(days_per_item, remaining)
+        rows = []
+        for d in range(days):
+            price = 100.0 + (i % 97) + d * 0.1
+            rows.append((name, str(i), BASE_TIMESTAMP + d * DAY_SECONDS,
+                         price, price + 0.5, price + 1.0, price - 1.0, 10.0, price * 10.0))
+        items.append(rows)
+        remaining -= days
+    return items
+
+
+def legacy_save(db_path: str, items: List[List[Tuple]]) -> int:
+    """旧版写入方式：每根K线先 SELECT COUNT(*) 再单独 INSERT"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute('''
+    CREATE TABLE kline_data (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        market_hash_name TEXT NOT NULL,
+        type_val TEXT NOT NULL,
+        timestamp INTEGER NOT NULL,
+        open_price REAL NOT NULL,
+        close_price REAL NOT NULL,
+        high_price REAL NOT NULL,
+        low_price REAL NOT NULL,
+        volume REAL NOT NULL,
+        turnover REAL NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    cursor.execute('CREATE INDEX idx_market_timestamp ON kline_data(market_hash_name, timestamp)')
+    conn.commit()
+
+    saved = 0
+    for rows in items:
+        for row in rows:
+            cursor.execute('''
+            SELECT COUNT(*) FROM kline_data
+            WHERE market_hash_name = ? AND timestamp = ?
+            ''', (row[0], row[2]))
+            if cursor.fetchone()[0] > 0:
+                continue
+            cursor.execute('''
+            INSERT INTO kline_data
+            (market_hash_name, type_val, timestamp, open_price, close_price, high_price, low_price, volume, turnover)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', row)
+            saved += 1
+        conn.commit()
+    conn.close()
+    return saved
+
+
+def batched_save(db_path: str, items: List[List[Tuple]]) -> int:
+    """新版写入方式：每个物品一次 executemany + ON CONFLICT DO NOTHING"""
+    get_kline.DATABASE_NAME = db_path
+    get_kline.create_database()
+    return sum(get_kline.save_kline_rows(rows) for rows in items)
+
+
+def bench_kline_upsert(total_rows: int):
+    """对比旧版逐行写入与批量upsert的写入速率"""
+    print(f"生成 {total_rows} 根合成K线数据...")
+    items = generate_kline_rows(total_rows)
+    print(f"共 {len(items)} 个物品")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for label, save_func in (("逐行 SELECT + INSERT", legacy_save), ("executemany upsert", batched_save)):
+            db_path = os.path.join(tmp_dir, f"{save_func.__name__}.db")
+            start = time.perf_counter()
+            saved = save_func(db_path, items)
+            elapsed = time.perf_counter() - start
+            print(f"{label:<24} 写入 {saved} 行, 耗时 {elapsed:.2f} 秒, {saved / elapsed:,.0f} 行/秒")
+
+
+PLATFORMS = ("BUFF", "YOUPIN", "C5", "STEAM", "HALOSKINS", "IGXE")
+
+
+def generate_catalog(item_count: int) -> List[dict]:
+    """生成与 /open/cs2/v1/base 返回结构相同的合成物品列表"""
+    return [
+        {
+            "name": f"合成物品 {i}",
+            "marketHashName": f"Synthetic Item {i:06d}",
+            "platformList": [{"name": platform, "itemId": str(10 ** 17 + i * 10 + p)}
+                             for p, platform in enumerate(PLATFORMS)],
+        }
+        for i in range(item_count)
+    ]
+
+
+def legacy_load_mapping(cache_file: str, item_names: List[str]) -> Dict[str, str]:
+    """旧版启动方式：解析整个JSON缓存后建立全量C5映射"""
+    with open(cache_file, 'r', encoding='utf-8') as f:
+        items_data = json.load(f)
+    mapping = {}
+    for item in items_data:
+        for platform in item.get('platformList', []):
+            if platform.get('name') == 'C5':
+                mapping[item['marketHashName']] = platform.get('itemId')
+                break
+    return {name: mapping[name] for name in item_names if name in mapping}
+
+
+def measure(func, *args):
+    """返回 (结果, 耗时秒, 峰值内存MB)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def bench_catalog_startup(item_count: int, lookup_count: int = 50):
+    """对比解析完整JSON缓存与查询物品目录的启动耗时和峰值内存"""
+    all_items = generate_catalog(item_count)
+    item_names = [all_items[i]['marketHashName'] for i in range(0, item_count, max(1, item_count // lookup_count))]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache_file = os.path.join(tmp_dir, "all_items_cache.json")
+        with open(cache_file, 'w', encoding='utf-8') as f:
+            json.dump(all_items, f, ensure_ascii=False, indent=4)
+
+        item_catalog.CATALOG_DATABASE = os.path.join(tmp_dir, "item_catalog.db")
+        item_catalog.build_catalog(all_items)
+        storage.close_all()
+        del all_items
+
+        print(f"目录规模 {item_count} 个物品，查询 {len(item_names)} 个物品的C5 itemId")
+        legacy, elapsed, peak = measure(legacy_load_mapping, cache_file, item_names)
+        print(f"{'解析JSON缓存':<16} 耗时 {elapsed * 1000:8.1f} ms, 峰值内存 {peak:8.1f} MB")
+        indexed, elapsed, peak = measure(item_catalog.get_platform_item_ids, item_names, 'C5')
+        print(f"{'查询物品目录':<16} 耗时 {elapsed * 1000:8.1f} ms, 峰值内存 {peak:8.1f} MB")
+        assert legacy == indexed
+        storage.close_all()
+
+
+def legacy_ingest(body_file: str, tmp_dir: str):
+    """旧版写入方式：完整解析响应，写出缩进JSON缓存，再遍历一次写出名称列表"""
+    with open(body_file, 'r', encoding='utf-8') as f:
+        all_items = json.load(f)['data']
+    with open(os.path.join(tmp_dir, "all_items_cache.json"), 'w', encoding='utf-8') as f:
+        json.dump(all_items, f, ensure_ascii=False, indent=4)
+    item_catalog.build_catalog(all_items)
+    with open(os.path.join(tmp_dir, "legacy_names.txt"), 'w', encoding='utf-8') as f:
+        for item in all_items:
+            f.write(item['marketHashName'] + '\n')
+
+
+def streaming_ingest(body_file: str, tmp_dir: str):
+    """流式写入方式：一次遍历响应流，同时写入物品目录和名称列表"""
+    status = {}
+    with open(body_file, 'rb') as body, open(os.path.join(tmp_dir, "names.txt"), 'w', encoding='utf-8') as names_file:
+        all_items = get_all_items.tee_market_hash_names(get_all_items.iter_catalog_items(body, status), names_file, status)
+        item_catalog.build_catalog(all_items, os.path.join(tmp_dir, "catalog_diff.txt"))
+
+
+def bench_catalog_ingest(item_count: int):
+    """对比完整解析与流式解析 /base 响应并写入目录的耗时和峰值内存"""
+    if get_all_items.ijson is None:
+        print("⚠️  未安装 ijson，流式解析将回退为一次性解析")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        body_file = os.path.join(tmp_dir, "base.json")
+        with open(body_file, 'w', encoding='utf-8') as f:
+            json.dump({"success": True, "data": generate_catalog(item_count), "errorCode": 0}, f, ensure_ascii=False)
+
+        print(f"目录规模 {item_count} 个物品，响应体 {os.path.getsize(body_file) / 1024 / 1024:.1f} MB")
+        item_catalog.CATALOG_DATABASE = os.path.join(tmp_dir, "legacy_catalog.db")
+        _, elapsed, peak = measure(legacy_ingest, body_file, tmp_dir)
+        print(f"{'完整解析':<16} 耗时 {elapsed * 1000:8.1f} ms, 峰值内存 {peak:8.1f} MB")
+        storage.close_all()
+
+        item_catalog.CATALOG_DATABASE = os.path.join(tmp_dir, "streaming_catalog.db")
+        _, elapsed, peak = measure(streaming_ingest, body_file, tmp_dir)
+        print(f"{'流式解析':<16} 耗时 {elapsed * 1000:8.1f} ms, 峰值内存 {peak:8.1f} MB")
+        storage.close_all()
+
+
+def bench_indicators(item_count: int, days: int):
+    """全量计算与追加一日K线后增量更新技术指标的耗时"""
+    items = generate_kline_rows(item_count * days, days)
+    latest_day = [rows.pop() for rows in items]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        get_kline.DATABASE_NAME = indicators.DATABASE_NAME = os.path.join(tmp_dir, "kline.db")
+        batched_save(get_kline.DATABASE_NAME, items)
+        print(f"{item_count} 个物品，每个 {days} 根日K线")
+
+        start = time.perf_counter()
+        indicators.update_indicators()
+        print(f"{'全量计算':<16} 耗时 {time.perf_counter() - start:.2f} 秒")
+
+        get_kline.save_kline_rows(latest_day)
+        start = time.perf_counter()
+        indicators.update_indicators()
+        print(f"{'增量更新一日':<16} 耗时 {time.perf_counter() - start:.2f} 秒")
+        storage.close_all()
+
+
+def bench_beta(item_count: int, days: int):
+    """全量计算与大盘指数、各物品各追加一日后增量更新市场Beta的耗时"""
+    rng = np.random.default_rng(0)
+    index_values = 1000.0 * np.cumprod(1.0 + rng.normal(0.0, 0.01, days))
+    index_rows = [(float(value), BASE_TIMESTAMP + d * DAY_SECONDS) for d, value in enumerate(index_values)]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        get_kline.DATABASE_NAME = market_beta.DATABASE_NAME = os.path.join(tmp_dir, "kline.db")
+        get_market_index.DATABASE_NAME = os.path.join(tmp_dir, "market_index.db")
+        get_kline.create_database()
+        get_market_index.create_database()
+        get_market_index.migrate_unique_timestamp()
+
+        # 逐个物品生成并写入，避免一次性持有全部合成数据
+        index_returns = index_values[1:] / index_values[:-1] - 1.0
+        latest_day = []
+        for i in range(item_count):
+            returns = rng.uniform(-0.5, 2.0) * index_returns + rng.normal(0.0, 0.02, days - 1)
+            closes = 100.0 * np.cumprod(np.concatenate(([1.0], 1.0 + returns)))
+            rows = [(f"Synthetic Item {i:06d}", str(i), BASE_TIMESTAMP + d * DAY_SECONDS,
+                     close, close, close, close, 10.0, close * 10.0) for d, close in enumerate(closes.tolist())]
+            latest_day.append(rows.pop())
+            get_kline.save_kline_rows(rows)
+        with storage.transaction(get_market_index.DATABASE_NAME) as cursor:
+            cursor.executemany('INSERT INTO market_index (index_value, timestamp) VALUES (?, ?)', index_rows[:-1])
+        print(f"{item_count} 个物品，每个 {days} 根日K线，窗口 {market_beta.BETA_WINDOW} 日")
+
+        start = time.perf_counter()
+        market_beta.update_betas()
+        print(f"{'全量计算':<16} 耗时 {time.perf_counter() - start:.2f} 秒")
+
+        get_kline.save_kline_rows(latest_day)
+        with storage.transaction(get_market_index.DATABASE_NAME) as cursor:
+            cursor.execute('INSERT INTO market_index (index_value, timestamp) VALUES (?, ?)', index_rows[-1])
+        start = time.perf_counter()
+        market_beta.update_betas()
+        print(f"{'增量更新一日':<16} 耗时 {time.perf_counter() - start:.2f} 秒")
+        storage.close_all()
+
+
+def bench_latest_price(total_rows: int, item_count: int):
+    """对比在快照历史中查找最新价格与读取 latest_price，以及写入时维护 latest_price 的开销"""
+    snapshots = max(1, total_rows // (item_count * len(PLATFORMS)))
+    names = [f"Synthetic Item {i:06d}" for i in range(item_count)]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "prices.db")
+        conn = storage.get_connection(db_path)
+        database_setup.ensure_schema(conn)
+
+        print(f"生成 {item_count * len(PLATFORMS) * snapshots} 条价格快照（{item_count} 个物品 x {len(PLATFORMS)} 个平台 x {snapshots} 次）...")
+        with storage.transaction(db_path) as cursor:
+            item_ids = database_setup.intern_items(cursor, names)
+            platform_ids = database_setup.intern_platforms(cursor, PLATFORMS)
+            cursor.executemany('''
+            INSERT INTO price_snapshots (item_id, timestamp, platform_id, sell_price, sell_count, bidding_price, bidding_count, sales_volume)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', ((item_ids[name], BASE_TIMESTAMP + k * 3600, platform_ids[platform], 10000 + k, 5, 9900 + k, 3, None)
+                  for name, k, platform in itertools.product(names, range(snapshots), PLATFORMS)))
+
+        # 迁移时的一次性回填
+        with storage.transaction(db_path) as cursor:
+            start = time.perf_counter()
+            backfilled = database_setup._backfill_latest_price(cursor)
+            print(f"{'回填 latest_price':<28} {backfilled} 行, 耗时 {time.perf_counter() - start:.2f} 秒")
+
+        cursor = conn.cursor()
+        watchlist = names[::max(1, item_count // 200)]
+        start = time.perf_counter()
+        for name in watchlist:
+            cursor.execute('''
+            SELECT s.platform_id, s.sell_price, s.bidding_price FROM price_snapshots AS s
+            WHERE s.item_id = ? AND s.timestamp = (SELECT MAX(timestamp) FROM price_snapshots WHERE item_id = ?)
+            ''', (item_ids[name], item_ids[name]))
+            cursor.fetchall()
+        print(f"{'快照中逐个查最新价':<24} {len(watchlist)} 个物品, 耗时 {time.perf_counter() - start:.3f} 秒")
+
+        start = time.perf_counter()
+        database_setup.read_latest_prices(cursor, watchlist)
+        print(f"{'latest_price 查关注列表':<24} {len(watchlist)} 个物品, 耗时 {time.perf_counter() - start:.3f} 秒")
+
+        start = time.perf_counter()
+        cursor.execute('''
+        SELECT item_id, platform_id, MAX(timestamp), sell_price, bidding_price FROM price_snapshots
+        GROUP BY item_id, platform_id
+        ''')
+        grouped = len(cursor.fetchall())
+        print(f"{'快照中 GROUP BY 全部':<24} {grouped} 行, 耗时 {time.perf_counter() - start:.3f} 秒")
+
+        start = time.perf_counter()
+        latest = len(database_setup.read_latest_prices(cursor))
+        print(f"{'latest_price 读取全部':<24} {latest} 行, 耗时 {time.perf_counter() - start:.3f} 秒")
+
+        # 写入一次完整快照：price_snapshots 插入与 latest_price 更新分别计时
+        timestamp = BASE_TIMESTAMP + snapshots * 3600
+        records = [(item_ids[name], timestamp, platform_ids[platform], 20000, 5, 19900, 3, None)
+                   for name in names for platform in PLATFORMS]
+        with storage.transaction(db_path) as cursor:
+            start = time.perf_counter()
+            cursor.executemany('''
+            INSERT OR REPLACE INTO price_snapshots (item_id, timestamp, platform_id, sell_price, sell_count, bidding_price, bidding_count, sales_volume)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', records)
+            insert_elapsed = time.perf_counter() - start
+            start = time.perf_counter()
+            cursor.executemany(database_setup.SQL_UPSERT_LATEST_PRICE, records)
+            upsert_elapsed = time.perf_counter() - start
+        print(f"写入 {len(records)} 条快照耗时 {insert_elapsed:.3f} 秒，同时更新 latest_price 额外耗时 {upsert_elapsed:.3f} 秒")
+        storage.close_all()
+
+
+def generate_price_batch(item_count: int) -> List[dict]:
+    """生成与 /price/batch 返回格式相同的合成报价，每个物品在各平台随机缺失、价格随机浮动"""
+    rng = np.random.default_rng(0)
+    price_data = []
+    for i in range(item_count):
+        base = float(rng.uniform(1, 5000))
+        data_list = []
+        for platform in PLATFORMS:
+            if rng.random() < 0.1:
+                continue
+            sell = round(base * rng.uniform(0.97, 1.05), 2)
+            data_list.append({
+                "platform": platform,
+                "platformItemId": f"{platform}-{i}",
+                "sellPrice": sell,
+                "sellCount": int(rng.integers(0, 500)),
+                "biddingPrice": round(sell * rng.uniform(0.9, 1.02), 2),
+                "biddingCount": int(rng.integers(0, 100)),
+                "updateTime": BASE_TIMESTAMP,
+            })
+        price_data.append({"marketHashName": f"Synthetic Item {i:06d}", "dataList": data_list})
+    return price_data
+
+
+def bench_spread_scan(item_count: int):
+    """对全量批量报价做一次跨平台价差扫描的耗时"""
+    price_data = generate_price_batch(item_count)
+    print(f"{item_count} 个物品，{len(PLATFORMS)} 个平台")
+
+    start = time.perf_counter()
+    quotes = spread_scanner.QuoteMatrix.from_price_data(price_data)
+    built = time.perf_counter() - start
+    start = time.perf_counter()
+    opportunities = spread_scanner.rank_opportunities(quotes, spread_scanner.best_spreads(quotes))
+    scanned = time.perf_counter() - start
+    print(f"构建报价矩阵耗时 {built:.3f} 秒，计算价差并排序耗时 {scanned:.3f} 秒，前 {len(opportunities)} 个机会")
+
+
+def bench_full_capture(item_count: int, polls: int, change_rate: float):
+    """多次轮询全量报价，每次只有 change_rate 比例的报价变化，统计完整采集的写入耗时和实际存储的行数"""
+    rng = np.random.default_rng(1)
+    price_data = generate_price_batch(item_count)
+    quotes = [quote for item in price_data for quote in item["dataList"]]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        get_prices.DATABASE_NAME = os.path.join(tmp_dir, "prices.db")
+        print(f"{item_count} 个物品，共 {len(quotes)} 条平台报价，轮询 {polls} 次，每次约 {change_rate:.0%} 的报价变化")
+
+        elapsed = []
+        for poll in range(polls):
+            # 每次轮询所有报价的 updateTime 都会前进，但只有部分报价的价格真正变化
+            for quote in quotes:
+                quote["updateTime"] = BASE_TIMESTAMP + poll * 300
+            if poll > 0:
+                for k in rng.choice(len(quotes), int(len(quotes) * change_rate), replace=False):
+                    quotes[k]["sellPrice"] = round(quotes[k]["sellPrice"] * 1.01, 2)
+            start = time.perf_counter()
+            get_prices.save_platform_quotes(price_data, BASE_TIMESTAMP + poll * 300)
+            elapsed.append(time.perf_counter() - start)
+
+        cursor = storage.get_connection(get_prices.DATABASE_NAME).cursor()
+        cursor.execute('SELECT COUNT(*) FROM platform_quotes')
+        stored = cursor.fetchone()[0]
+        print(f"共轮询 {len(quotes) * polls} 条报价，实际存储 {stored} 条")
+        print(f"首次写入耗时 {elapsed[0]:.2f} 秒，之后每次平均 {sum(elapsed[1:]) / max(1, polls - 1):.2f} 秒")
+        storage.close_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="性能基准测试")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    kline_parser = subparsers.add_parser('kline-upsert', help="K线批量写入 vs 逐行写入")
+    kline_parser.add_argument('--rows', type=int, default=1_000_000, help="合成K线数量")
+
+    catalog_parser = subparsers.add_parser('catalog-startup', help="物品目录查询 vs 解析完整JSON缓存")
+    catalog_parser.add_argument('--items', type=int, default=28000, help="合成目录中的物品数量")
+
+    ingest_parser = subparsers.add_parser('catalog-ingest', help="流式解析物品列表 vs 完整解析")
+    ingest_parser.add_argument('--items', type=int, default=28000, help="合成目录中的物品数量")
+
+    indicators_parser = subparsers.add_parser('indicators', help="技术指标全量计算 vs 增量更新")
+    indicators_parser.add_argument('--items', type=int, default=5000, help="合成物品数量")
+    indicators_parser.add_argument('--days', type=int, default=365, help="每个物品的日K线数量")
+
+    beta_parser = subparsers.add_parser('beta', help="市场Beta全量计算 vs 增量更新")
+    beta_parser.add_argument('--items', type=int, default=28000, help="合成物品数量")
+    beta_parser.add_argument('--days', type=int, default=180, help="每个物品的日K线数量")
+
+    latest_parser = subparsers.add_parser('latest-price', help="latest_price 表 vs 在快照历史中查找最新价格")
+    latest_parser.add_argument('--rows', type=int, default=10_000_000, help="合成价格快照数量")
+    latest_parser.add_argument('--items', type=int, default=2000, help="合成物品数量")
+
+    spread_parser = subparsers.add_parser('spread-scan', help="全量报价的跨平台价差扫描")
+    spread_parser.add_argument('--items', type=int, default=28000, help="合成物品数量")
+
+    capture_parser = subparsers.add_parser('full-capture', help="完整采集模式的去重写入")
+    capture_parser.add_argument('--items', type=int, default=28000, help="合成物品数量")
+    capture_parser.add_argument('--polls', type=int, default=10, help="轮询次数")
+    capture_parser.add_argument('--change-rate', type=float, default=0.05, help="每次轮询中价格变化的报价比例")
+
+    args = parser.parse_args()
+    if args.command == 'kline-upsert':
+        bench_kline_upsert(args.rows)
+    elif args.command == 'catalog-startup':
+        bench_catalog_startup(args.items)
+    elif args.command == 'catalog-ingest':
+        bench_catalog_ingest(args.items)
+    elif args.command == 'indicators':
+        bench_indicators(args.items, args.days)
+    elif args.command == 'beta':
+        bench_beta(args.items, args.days)
+    elif args.command == 'latest-price':
+        bench_latest_price(args.rows, args.items)
+    elif args.command == 'spread-scan':
+        bench_spread_scan(args.items)
+    elif args.command == 'full-capture':
+        bench_full_capture(args.items, args.polls, args.change_rate)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,82 +1,117 @@
 #!/usr/bin/env python3
-import sqlite3
-from datetime import datetime, timedelta
-
-# 连接数据库
-conn = sqlite3.connect('kline.db')
-cursor = conn.cursor()
-
-# 选择一个物品进行详细分析
-item_name = 'M4A1-S | Printstream (Factory New)'
-
-print(f'详细分析物品: {item_name}')
-print('=' * 60)
-
-# 获取所有时间戳并排序
-cursor.execute('''
-SELECT timestamp, open_price, close_price 
-FROM kline_data 
-WHERE market_hash_name = ? 
-ORDER BY timestamp
-''', (item_name,))
-
-records = cursor.fetchall()
-timestamps = [record[0] for record in records]
-
-if timestamps:
-    print(f'总记录数: {len(timestamps)}')
-    print(f'最早时间: {datetime.fromtimestamp(timestamps[0]).strftime("%Y-%m-%d %H:%M:%S")}')
-    print(f'最新时间: {datetime.fromtimestamp(timestamps[-1]).strftime("%Y-%m-%d %H:%M:%S")}')
-    
-    # 计算时间跨度
-    time_span_days = (timestamps[-1] - timestamps[0]) / (24 * 3600)
-    print(f'时间跨度: {time_span_days:.1f} 天')
-    print(f'应有记录数: {int(time_span_days) + 1}')
-    print(f'实际记录数: {len(timestamps)}')
-    print(f'缺失记录数: {int(time_span_days) + 1 - len(timestamps)}')
-    
-    print('\n检查数据连续性:')
-    print('-' * 40)
-    
-    # 检查连续性
-    expected_timestamp = timestamps[0]
-    missing_periods = []
-    
-    for i, ts in enumerate(timestamps):
-        if ts != expected_timestamp:
-            # 发现缺失
-            missing_start = expected_timestamp
-            missing_end = ts - 86400  # 前一天
-            
-            if missing_end >= missing_start:
-                missing_periods.append((missing_start, missing_end))
-            
-            print(f'位置 {i+1}: 期望 {datetime.fromtimestamp(expected_timestamp).strftime("%Y-%m-%d")}, 实际 {datetime.fromtimestamp(ts).strftime("%Y-%m-%d")}')
-        
-        expected_timestamp = ts + 86400  # 下一天
-    
-    if missing_periods:
-        print(f'\n发现 {len(missing_periods)} 个缺失期间:')
-        for start, end in missing_periods:
-            start_date = datetime.fromtimestamp(start).strftime("%Y-%m-%d")
-            end_date = datetime.fromtimestamp(end).strftime("%Y-%m-%d")
-            days_missing = (end - start) / 86400 + 1
-            print(f'  {start_date} 至 {end_date} (缺失 {days_missing:.0f} 天)')
-    else:
-        print('✅ 数据连续，无缺失')
-    
-    # 显示前10条和后10条记录
-    print(f'\n前10条记录:')
-    for i, ts in enumerate(timestamps[:10]):
-        date = datetime.fromtimestamp(ts).strftime("%Y-%m-%d")
-        print(f'  {i+1:2d}. {date}')
-    
-    print(f'\n后10条记录:')
-    for i, ts in enumerate(timestamps[-10:], len(timestamps)-9):
-        date = datetime.fromtimestamp(ts).strftime("%Y-%m-%d")
-        print(f'  {i:2d}. {date}')
-
-else:
-    print('❌ 未找到数据')
-
-conn.close()
\ No newline at end of file
+import argparse
+import csv
+import time
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import storage
+from time_utils import DAY_SECONDS
+
+DATABASE_NAME = 'kline.db'
+BEIJING_TZ = timezone(timedelta(hours=8))
+
+CSV_FIELDS = ['market_hash_name', 'gap_start', 'gap_end', 'missing_days']
+
+
+def format_date(timestamp: int) -> str:
+    """将北京时间0点的时间戳格式化为日期"""
+    return datetime.fromtimestamp(timestamp, BEIJING_TZ).strftime("%Y-%m-%d")
+
+
+def find_missing_ranges(market_hash_names: Optional[List[str]] = None) -> List[Tuple[str, int, int, int]]:
+    """
+    一次查询找出所有物品缺失的日K线区间
+    用 LAG 取每根K线的前一根时间戳，相差超过一天即为缺口。
+    返回 [(物品名称, 缺口起始时间戳, 缺口结束时间戳, 缺失天数)]，起止时间戳均包含在缺口内。
+    """
+    where = ""
+    params = []
+    if market_hash_names:
+        where = f"WHERE market_hash_name IN ({','.join('?' * len(market_hash_names))})"
+        params = list(market_hash_names)
+
+    cursor = storage.get_connection(DATABASE_NAME).cursor()
+    cursor.execute(f'''
+    SELECT market_hash_name,
+           prev_timestamp + {DAY_SECONDS} AS gap_start,
+           timestamp - {DAY_SECONDS} AS gap_end,
+           (timestamp - prev_timestamp) / {DAY_SECONDS} - 1 AS missing_days
+    FROM (
+        SELECT market_hash_name, timestamp,
+               LAG(timestamp) OVER (PARTITION BY market_hash_name ORDER BY timestamp) AS prev_timestamp
+        FROM kline_data {where}
+    )
+    WHERE timestamp - prev_timestamp > {DAY_SECONDS}
+    ORDER BY market_hash_name, gap_start
+    ''', params)
+    return cursor.fetchall()
+
+
+def group_by_item(missing_ranges: List[Tuple[str, int, int, int]]) -> Dict[str, List[Tuple[int, int]]]:
+    """将缺口列表整理为 {物品名称: [(缺口起始, 缺口结束)]}"""
+    grouped = {}
+    for market_hash_name, gap_start, gap_end, _ in missing_ranges:
+        grouped.setdefault(market_hash_name, []).append((gap_start, gap_end))
+    return grouped
+
+
+def write_csv(missing_ranges: List[Tuple[str, int, int, int]], path: str):
+    """写出缺口列表，可作为采集程序的补采清单"""
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_FIELDS)
+        writer.writerows(missing_ranges)
+
+
+def read_csv(path: str) -> List[Tuple[str, int, int, int]]:
+    """读取 write_csv 写出的缺口列表"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return [
+            (row['market_hash_name'], int(row['gap_start']), int(row['gap_end']), int(row['missing_days']))
+            for row in csv.DictReader(f)
+        ]
+
+
+def print_report(missing_ranges: List[Tuple[str, int, int, int]]):
+    """按物品输出紧凑的缺口表"""
+    grouped = group_by_item(missing_ranges)
+    if not grouped:
+        print('✅ 所有物品数据连续，无缺失')
+        return
+
+    print(f"{'物品':<56} {'缺口数':>6} {'缺失天数':>8}  缺失区间")
+    print('-' * 110)
+    for market_hash_name, ranges in grouped.items():
+        missing_days = sum((end - start) // DAY_SECONDS + 1 for start, end in ranges)
+        spans = ', '.join(
+            format_date(start) if start == end else f"{format_date(start)}~{format_date(end)}"
+            for start, end in ranges
+        )
+        print(f"{market_hash_name:<56} {len(ranges):>6} {missing_days:>8}  {spans}")
+
+    total_days = sum(row[3] for row in missing_ranges)
+    print('-' * 110)
+    print(f'共 {len(grouped)} 个物品存在缺口，{len(missing_ranges)} 个缺失区间，合计缺失 {total_days} 天')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查所有物品日K线数据的连续性")
+    parser.add_argument('--item', action='append', help="只检查指定物品（可重复）")
+    parser.add_argument('--output', help="将缺口列表写入CSV文件，供 get_kline.py 补采使用")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    missing_ranges = find_missing_ranges(args.item)
+    elapsed = time.perf_counter() - start
+
+    print_report(missing_ranges)
+    print(f'检查耗时: {elapsed:.2f} 秒')
+
+    if args.output:
+        write_csv(missing_ranges, args.output)
+        print(f'✅ 缺口列表已写入 {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,49 +1,302 @@
 # -*- coding: utf-8 -*-
+import re
 import sqlite3
 
+import storage
+
 # --- 数据库设置 ---
 DATABASE_NAME = "csgo_market_data.db"
+# 数据库迁移版本（PRAGMA user_version）
+SCHEMA_NORMALIZED = 1  # price_history 拆分为 items / platforms / price_snapshots
+SCHEMA_LATEST_PRICE = 2  # latest_price 最新价格表
+SCHEMA_PLATFORM_QUOTES = 3  # platform_quotes / platform_item_ids 全平台报价
+
+# 规范化的表结构：饰品名称和平台名称各只存一次，快照表只存整数ID
+# 价格以"分"为单位的整数存储，sales_volume 为整数，未能获取时为NULL
+# price_snapshots 以 (item_id, timestamp, platform_id) 为主键且不带rowid，按饰品和时间的范围查询直接走主键
+SCHEMA_STATEMENTS = (
+    """
+    CREATE TABLE IF NOT EXISTS items (
+        item_id INTEGER PRIMARY KEY,
+        market_hash_name TEXT NOT NULL UNIQUE
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS platforms (
+        platform_id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS price_snapshots (
+        item_id INTEGER NOT NULL,
+        timestamp INTEGER NOT NULL,
+        platform_id INTEGER NOT NULL,
+        sell_price INTEGER,
+        sell_count INTEGER,
+        bidding_price INTEGER,
+        bidding_count INTEGER,
+        sales_volume INTEGER,
+        PRIMARY KEY (item_id, timestamp, platform_id)
+    ) WITHOUT ROWID;
+    """,
+)
+
+# 兼容视图：保持旧版 price_history 的列名和单位，已有的查询无需修改
+SQL_CREATE_PRICE_HISTORY_VIEW = """
+CREATE VIEW IF NOT EXISTS price_history AS
+SELECT items.market_hash_name AS market_hash_name,
+       s.timestamp AS timestamp,
+       platforms.name AS platform,
+       s.sell_price / 100.0 AS sell_price,
+       s.sell_count AS sell_count,
+       s.bidding_price / 100.0 AS bidding_price,
+       s.bidding_count AS bidding_count,
+       s.sales_volume AS sales_volume
+FROM price_snapshots AS s
+JOIN items ON items.item_id = s.item_id
+JOIN platforms ON platforms.platform_id = s.platform_id;
+"""
+
+# 每个饰品在每个平台的最新快照，与 price_snapshots 在同一事务中维护
+# 查询当前价格只需读取 (物品数 x 平台数) 行，不必在快照历史中按饰品查找最大时间戳
+SQL_CREATE_LATEST_PRICE = """
+CREATE TABLE IF NOT EXISTS latest_price (
+    item_id INTEGER NOT NULL,
+    platform_id INTEGER NOT NULL,
+    timestamp INTEGER NOT NULL,
+    sell_price INTEGER,
+    sell_count INTEGER,
+    bidding_price INTEGER,
+    bidding_count INTEGER,
+    sales_volume INTEGER,
+    PRIMARY KEY (item_id, platform_id)
+) WITHOUT ROWID;
+"""
+
+# 参数顺序与 price_snapshots 的插入语句相同，同一批记录可直接复用
+# 只有不早于现有记录的快照才会覆盖，补写的历史快照不会改变最新价格
+SQL_UPSERT_LATEST_PRICE = """
+INSERT INTO latest_price (item_id, timestamp, platform_id, sell_price, sell_count, bidding_price, bidding_count, sales_volume)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(item_id, platform_id) DO UPDATE SET
+    timestamp = excluded.timestamp,
+    sell_price = excluded.sell_price,
+    sell_count = excluded.sell_count,
+    bidding_price = excluded.bidding_price,
+    bidding_count = excluded.bidding_count,
+    sales_volume = excluded.sales_volume
+WHERE excluded.timestamp >= latest_price.timestamp
+"""
+
+# 完整采集模式下各平台的原始报价，长表格式，以平台报价的更新时间为键
+# 与上一条报价完全相同的报价不写入，表的增长只取决于价格变化的次数，与采集频率无关
+SQL_CREATE_PLATFORM_QUOTES = """
+CREATE TABLE IF NOT EXISTS platform_quotes (
+    item_id INTEGER NOT NULL,
+    platform_id INTEGER NOT NULL,
+    update_time INTEGER NOT NULL,
+    sell_price INTEGER,
+    sell_count INTEGER,
+    bidding_price INTEGER,
+    bidding_count INTEGER,
+    PRIMARY KEY (item_id, platform_id, update_time)
+) WITHOUT ROWID;
+"""
+
+# 饰品在各平台的商品ID几乎不变，单独存放而不在每条报价中重复
+SQL_CREATE_PLATFORM_ITEM_IDS = """
+CREATE TABLE IF NOT EXISTS platform_item_ids (
+    item_id INTEGER NOT NULL,
+    platform_id INTEGER NOT NULL,
+    platform_item_id TEXT NOT NULL,
+    PRIMARY KEY (item_id, platform_id)
+) WITHOUT ROWID;
+"""
+
+# 每次查询中ID映射的名称数量，低于SQLite的参数个数上限
+LOOKUP_CHUNK_SIZE = 500
+
+def to_cents(price):
+    """将价格转换为以分为单位的整数，None保持为None"""
+    if price is None:
+        return None
+    return int(round(float(price) * 100))
+
+def parse_sales_volume(value):
+    """
+    将抓取到的成交量文本转换为整数
+    支持 "123"、"1,234"、"1.2万"、"86 件"、"86件" 等格式，前后可带空白（包括不间断空格）；
+    无法识别（如"未能获取"）时返回None
+    """
+    if value is None:
+        return None
+    if isinstance(value, int):
+        return value
+    text = str(value).replace(',', '')
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*(万?)\s*件?\s*', text)
+    if not match:
+        return None
+    number = float(match.group(1))
+    if match.group(2):
+        number *= 10000
+    return int(round(number))
+
+def _intern_names(cursor, table, id_column, name_column, names):
+    """确保名称都在维度表中，并返回 {名称: ID}"""
+    names = list(dict.fromkeys(names))
+    cursor.executemany(f"INSERT OR IGNORE INTO {table} ({name_column}) VALUES (?)", [(name,) for name in names])
+    ids = {}
+    for i in range(0, len(names), LOOKUP_CHUNK_SIZE):
+        chunk = names[i:i + LOOKUP_CHUNK_SIZE]
+        cursor.execute(
+            f"SELECT {name_column}, {id_column} FROM {table} WHERE {name_column} IN ({','.join('?' * len(chunk))})",
+            chunk,
+        )
+        ids.update(cursor.fetchall())
+    return ids
+
+def intern_items(cursor, market_hash_names):
+    """返回 {market_hash_name: item_id}，新饰品会被自动加入items表"""
+    return _intern_names(cursor, 'items', 'item_id', 'market_hash_name', market_hash_names)
+
+def intern_platforms(cursor, platform_names):
+    """返回 {平台名称: platform_id}，新平台会被自动加入platforms表"""
+    return _intern_names(cursor, 'platforms', 'platform_id', 'name', platform_names)
 
 def create_connection():
     """ 创建一个到SQLite数据库的连接 """
     try:
-        conn = sqlite3.connect(DATABASE_NAME)
+        conn = storage.get_connection(DATABASE_NAME)
         print(f"✅ 成功连接到数据库 '{DATABASE_NAME}'")
         return conn
     except sqlite3.Error as e:
         print(f"❌ 数据库连接失败: {e}")
         return None
 
-def create_table(conn):
-    """ 在数据库中创建价格历史记录表 """
-    # 新的表结构：不再有items表，直接存储market_hash_name
-    # 增加了一个索引(index)在 market_hash_name 和 timestamp 上，能极大提高后续按饰品和时间查询的效率
-    sql_create_price_history_table = """
-    CREATE TABLE IF NOT EXISTS price_history (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        market_hash_name TEXT NOT NULL,
-        timestamp INTEGER NOT NULL,
-        platform TEXT NOT NULL,
-        sell_price REAL,
-        sell_count INTEGER,
-        bidding_price REAL,
-        bidding_count INTEGER
-    );
+def _object_type(cursor, name):
+    """返回数据库对象的类型（'table'、'view'等），不存在时返回None"""
+    cursor.execute("SELECT type FROM sqlite_master WHERE name = ?", (name,))
+    result = cursor.fetchone()
+    return result[0] if result else None
+
+def _migrate_legacy_price_history(cursor):
+    """
+    将旧版 price_history 表中的数据迁移到规范化的表中，然后删除旧表
+    价格转换为分，sales_volume 文本经 parse_sales_volume 转换为整数；同一主键的重复快照保留最后写入的一行。
+    """
+    cursor.execute("PRAGMA table_info(price_history)")
+    columns = [column[1] for column in cursor.fetchall()]
+    sales_volume_expr = "parse_sales_volume(h.sales_volume)" if 'sales_volume' in columns else "NULL"
+
+    cursor.execute("INSERT OR IGNORE INTO items (market_hash_name) SELECT DISTINCT market_hash_name FROM price_history")
+    cursor.execute("INSERT OR IGNORE INTO platforms (name) SELECT DISTINCT platform FROM price_history")
+    cursor.execute(f"""
+    INSERT OR REPLACE INTO price_snapshots
+    (item_id, timestamp, platform_id, sell_price, sell_count, bidding_price, bidding_count, sales_volume)
+    SELECT items.item_id, h.timestamp, platforms.platform_id,
+           CAST(ROUND(h.sell_price * 100) AS INTEGER), h.sell_count,
+           CAST(ROUND(h.bidding_price * 100) AS INTEGER), h.bidding_count,
+           {sales_volume_expr}
+    FROM price_history AS h
+    JOIN items ON items.market_hash_name = h.market_hash_name
+    JOIN platforms ON platforms.name = h.platform
+    ORDER BY h.id
+    """)
+    migrated = cursor.rowcount
+    cursor.execute("DROP TABLE price_history")
+    return migrated
+
+def _backfill_latest_price(cursor):
+    """
+    用已有快照回填 latest_price，返回回填的行数
+    SQLite 中与 MAX() 同时选出的裸列取自最大值所在的行，即每个饰品每个平台的最新快照。
     """
-    
-    sql_create_index = """
-    CREATE INDEX IF NOT EXISTS idx_name_time ON price_history (market_hash_name, timestamp);
+    cursor.execute("""
+    INSERT OR REPLACE INTO latest_price
+    (item_id, timestamp, platform_id, sell_price, sell_count, bidding_price, bidding_count, sales_volume)
+    SELECT item_id, MAX(timestamp), platform_id, sell_price, sell_count, bidding_price, bidding_count, sales_volume
+    FROM price_snapshots
+    GROUP BY item_id, platform_id
+    """)
+    return cursor.rowcount
+
+def ensure_schema(conn):
+    """
+    按版本依次执行迁移：
+    1. 创建规范化的表结构；若存在旧版 price_history 表则先迁移其中的数据，完成后执行VACUUM回收旧表占用的空间；
+    2. 创建 latest_price 并用已有快照回填；
+    3. 创建完整采集模式使用的 platform_quotes 和 platform_item_ids。
+    每一步在传入连接上的一个事务中完成。返回是否迁移了旧版 price_history。
+    """
+    cursor = conn.cursor()
+    version = storage.get_schema_version(cursor)
+    if version >= SCHEMA_PLATFORM_QUOTES:
+        return False
+
+    migrated = None
+    if version < SCHEMA_NORMALIZED:
+        conn.create_function('parse_sales_volume', 1, parse_sales_volume, deterministic=True)
+        with storage.connection_transaction(conn) as cursor:
+            cursor.execute("BEGIN")
+            for statement in SCHEMA_STATEMENTS:
+                cursor.execute(statement)
+            if _object_type(cursor, 'price_history') == 'table':
+                migrated = _migrate_legacy_price_history(cursor)
+            cursor.execute(SQL_CREATE_PRICE_HISTORY_VIEW)
+            storage.set_schema_version(cursor, SCHEMA_NORMALIZED)
+
+        if migrated is not None:
+            print(f"✅ 已将 {migrated} 条价格记录迁移到规范化的表结构")
+            conn.execute("VACUUM")
+
+    if version < SCHEMA_LATEST_PRICE:
+        with storage.connection_transaction(conn) as cursor:
+            cursor.execute("BEGIN")
+            cursor.execute(SQL_CREATE_LATEST_PRICE)
+            backfilled = _backfill_latest_price(cursor)
+            storage.set_schema_version(cursor, SCHEMA_LATEST_PRICE)
+        if backfilled:
+            print(f"✅ 已用价格快照回填 {backfilled} 条最新价格")
+
+    with storage.connection_transaction(conn) as cursor:
+        cursor.execute("BEGIN")
+        cursor.execute(SQL_CREATE_PLATFORM_QUOTES)
+        cursor.execute(SQL_CREATE_PLATFORM_ITEM_IDS)
+        storage.set_schema_version(cursor, SCHEMA_PLATFORM_QUOTES)
+    return migrated is not None
+
+def read_latest_prices(cursor, market_hash_names=None, since=None):
+    """
+    读取最新价格，返回 [(market_hash_name, 平台, 时间戳, 在售价, 在售数量, 求购价, 求购数量, 成交量)]
+    价格以分为单位；指定 market_hash_names 时只返回这些饰品，指定 since 时只返回时间戳不早于 since 的记录。
     """
-    
+    conditions = []
+    params = []
+    if market_hash_names is not None:
+        conditions.append(f"items.market_hash_name IN ({','.join('?' * len(market_hash_names))})")
+        params.extend(market_hash_names)
+    if since is not None:
+        conditions.append("l.timestamp >= ?")
+        params.append(since)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    cursor.execute(f"""
+    SELECT items.market_hash_name, platforms.name, l.timestamp,
+           l.sell_price, l.sell_count, l.bidding_price, l.bidding_count, l.sales_volume
+    FROM latest_price AS l
+    JOIN items ON items.item_id = l.item_id
+    JOIN platforms ON platforms.platform_id = l.platform_id
+    {where}
+    """, params)
+    return cursor.fetchall()
+
+def create_table(conn):
+    """ 在数据库中创建价格历史记录表 """
     try:
-        cursor = conn.cursor()
-        print("--- 正在创建 'price_history' 表 ---")
-        cursor.execute(sql_create_price_history_table)
-        print("✔️ 'price_history' 表已创建。")
-        
-        print("\n--- 正在为查询优化创建索引 ---")
-        cursor.execute(sql_create_index)
-        print("✔️ 性能索引已创建。")
+        print("--- 正在创建 'items' / 'platforms' / 'price_snapshots' / 'latest_price' / 'platform_quotes' 表 ---")
+        ensure_schema(conn)
+        print("✔️ 规范化的价格表已创建。")
+        print("✔️ 兼容视图 'price_history' 已创建。")
 
     except sqlite3.Error as e:
         print(f"❌ 数据库操作失败: {e}")
@@ -53,7 +306,7 @@ def main():
     conn = create_connection()
     if conn:
         create_table(conn)
-        conn.close()
+        storage.close_all()
         print("\n✅ 数据库初始化完成，连接已关闭。")
 
 if __name__ == '__main__':
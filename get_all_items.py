@@ -2,9 +2,17 @@
 import requests
 import json
 import os
-from datetime import datetime
+import sqlite3
 from config import API_KEY  # 从配置文件导入您的 API Key
 
+import http_client
+import item_catalog
+
+try:
+    import ijson  # 可选依赖：流式解析物品列表
+except ImportError:
+    ijson = None
+
 # --- 全局设置 ---
 BASE_URL = "https://open.steamdt.com"
 
@@ -14,62 +22,106 @@ HEADERS = {
     "Authorization": f"Bearer {API_KEY}",
     "Content-Type": "application/json"
 }
-# 所有物品信息的缓存文件名
-ALL_ITEMS_CACHE_FILE = "all_items_cache.json"
 # 仅包含 marketHashName 的文本文件名
 MARKET_HASH_NAME_FILE = "market_hash_names.txt"
+# 本次刷新中新增（+）、更新（~）和移除（-）的物品
+CATALOG_DIFF_FILE = "catalog_diff.txt"
+
+# 流式解析时可能出现的JSON格式错误
+JSON_ERRORS = (ValueError,) if ijson is None else (ValueError, ijson.JSONError)
+
+
+def iter_catalog_items(stream, status: dict):
+    """
+    从 /base 响应流中逐个产出物品信息，并把顶层的 success/errorMsg/errorCode 记录到 status
+    安装了 ijson 时边读边解析，内存占用与物品数量无关；否则回退到一次性解析。
+    响应不是 success:true 时在最后抛出 ValueError，使调用方的写入事务回滚。
+    """
+    if ijson is None:
+        data = json.load(stream)
+        status.update((key, data.get(key)) for key in ('success', 'errorMsg', 'errorCode'))
+        yield from data.get('data') or []
+    else:
+        builder = None
+        for prefix, event, value in ijson.parse(stream, use_float=True):
+            if builder is not None:
+                builder.event(event, value)
+                if prefix == 'data.item' and event == 'end_map':
+                    yield builder.value
+                    builder = None
+            elif prefix == 'data.item' and event == 'start_map':
+                builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+            elif prefix in ('success', 'errorMsg', 'errorCode'):
+                status[prefix] = value
+
+    if not status.get('success'):
+        raise ValueError(f"API 返回错误： {status.get('errorMsg') or '未知错误'} (错误码: {status.get('errorCode')})")
+
+
+def tee_market_hash_names(all_items, names_file, status: dict):
+    """物品流经时把 marketHashName 逐行写入 names_file，写入数量记录在 status['names']"""
+    status['names'] = 0
+    for item in all_items:
+        market_hash_name = item.get('marketHashName')
+        if market_hash_name:
+            names_file.write(market_hash_name + '\n')
+            status['names'] += 1
+        yield item
 
 
 def fetch_and_cache_all_items():
     """
     获取所有 CS2 饰品的基础信息。
-    如果今天已有缓存，则从本地加载；否则，从 API 获取并创建缓存。
+    API 响应缓存在本地（有效期见 http_client.CACHE_TTLS['base']），缓存有效时不会调用API。
+    响应体分块下载到磁盘后流式解析，一次遍历同时写入物品目录和 marketHashName 列表；
+    目录只应用新增、更新、移除的物品，变更记录可通过 item_catalog.changed_since() 增量读取。
     """
-    # 检查今天是否已经有缓存文件
-    if os.path.exists(ALL_ITEMS_CACHE_FILE):
-        try:
-            # 获取文件的最后修改日期
-            file_mod_date = datetime.fromtimestamp(os.path.getmtime(ALL_ITEMS_CACHE_FILE)).date()
-            if file_mod_date == datetime.today().date():
-                print(f"✔️  侦测到今日缓存，程序将不会调用API。所有物品信息已在 '{ALL_ITEMS_CACHE_FILE}' 中。")
-                return True
-        except Exception as e:
-            print(f"⚠️  读取缓存文件时出错: {e}。将尝试重新从 API 获取。")
-
-    print("ℹ️  本地无今日缓存，正在从 API 获取所有物品列表 (每日仅限一次)...")
     # API 端点完全符合文档： GET /open/cs2/v1/base
     endpoint = "/open/cs2/v1/base"
+    url = BASE_URL + endpoint
     try:
-        # 发送 GET 请求
-        response = requests.get(BASE_URL + endpoint, headers=HEADERS, timeout=60)
-        response.raise_for_status()  # 如果请求失败 (状态码非 2xx)，则抛出异常
-        
-        data = response.json()
-        if data.get("success"):
-            all_items = data.get("data", [])
-            print(f"✅ API 调用成功，获取到 {len(all_items)} 条物品信息。")
-
-            # 1. 缓存完整的 JSON 结果到本地文件
-            with open(ALL_ITEMS_CACHE_FILE, 'w', encoding='utf-8') as f:
-                json.dump(all_items, f, ensure_ascii=False, indent=4)
-            print(f"✔️  完整的物品信息已保存到 '{ALL_ITEMS_CACHE_FILE}'。")
-
-            # 2. 提取所有的 marketHashName 并保存到单独的文本文件
-            market_hash_names = [item['marketHashName'] for item in all_items if 'marketHashName' in item]
-            with open(MARKET_HASH_NAME_FILE, 'w', encoding='utf-8') as f:
-                for name in market_hash_names:
-                    f.write(name + '\n')
-            print(f"✔️  所有 Market Hash Name 已提取并保存到 '{MARKET_HASH_NAME_FILE}'。")
-            
-            return True
-        else:
-            print(f"❌ API 返回错误： {data.get('errorMsg', '未知错误')} (错误码: {data.get('errorCode')})")
-            return False
-
+        # 下载响应（优先使用本地缓存），如果请求失败 (状态码非 2xx)，则抛出异常
+        body_path, from_cache = http_client.download(url, 'base', headers=HEADERS, timeout=60)
     except requests.exceptions.RequestException as e:
         print(f"❌ 请求 API 时发生网络错误：{e}")
         return False
 
+    if from_cache and os.path.exists(MARKET_HASH_NAME_FILE) and item_catalog.ensure_catalog():
+        print(f"✔️  侦测到有效的本地缓存，程序将不会调用API。物品目录 '{item_catalog.CATALOG_DATABASE}' 已是最新。")
+        return True
+    if ijson is None:
+        print("⚠️  未安装 ijson，将一次性解析完整的物品列表（pip install ijson 可启用流式解析）。")
+
+    # 名称列表先写入临时文件，全部成功后再替换，失败时保留上一次的文件
+    status = {}
+    partial_names_file = MARKET_HASH_NAME_FILE + '.part'
+    try:
+        with open(body_path, 'rb') as body, open(partial_names_file, 'w', encoding='utf-8') as names_file:
+            all_items = tee_market_hash_names(iter_catalog_items(body, status), names_file, status)
+            platform_rows, added, updated, removed = item_catalog.build_catalog(all_items, CATALOG_DIFF_FILE)
+    except JSON_ERRORS + (sqlite3.Error,) as e:
+        print(f"❌ 处理物品列表失败：{e}")
+        # 不可用的响应不保留在缓存中，下次运行重新请求
+        http_client.invalidate(url)
+        if os.path.exists(partial_names_file):
+            os.remove(partial_names_file)
+        return False
+
+    source = "本地缓存" if from_cache else "API 调用"
+    print(f"✅ {source}成功，获取到 {status['names']} 条物品信息。")
+    print(f"✔️  物品目录 '{item_catalog.CATALOG_DATABASE}' 已更新：新增 {added} 个，更新 {updated} 个，移除 {removed} 个"
+          f"（共 {platform_rows} 条平台ID），明细见 '{CATALOG_DIFF_FILE}'。")
+
+    # 物品集合没有变化时保留原文件，读取名称列表的下游程序无需重新加载
+    if added or removed or not os.path.exists(MARKET_HASH_NAME_FILE):
+        os.replace(partial_names_file, MARKET_HASH_NAME_FILE)
+        print(f"✔️  所有 Market Hash Name 已提取并保存到 '{MARKET_HASH_NAME_FILE}'。")
+    else:
+        os.remove(partial_names_file)
+        print(f"✔️  物品集合没有变化，'{MARKET_HASH_NAME_FILE}' 保持不变。")
+    return True
+
 # --- 主程序执行区 ---
 if __name__ == "__main__":
     print("\n" + "="*25 + " 任务：获取所有物品列表 " + "="*25)
@@ -77,5 +129,6 @@ if __name__ == "__main__":
         print("🛑 错误：请先在 config.py 文件中填写您的 API_KEY。")
     else:
         fetch_and_cache_all_items()
+        http_client.print_request_stats()
     print("\n🎉  任务执行完毕。")
 
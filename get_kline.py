@@ -1,15 +1,27 @@
+import argparse
 import requests
-import json
 import sqlite3
 import os
 import time
-from datetime import datetime, timezone, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, List, Tuple, Optional
 
+import check_continuity
+import http_client
+import item_catalog
+import storage
+from rate_limiter import RateLimiter, RunStats
+from time_utils import DAY_SECONDS, adjust_to_beijing_midnight, beijing_midnight, now_ms, to_milliseconds
+
+try:
+    import indicators  # 可选依赖：技术指标和市场Beta需要 numpy
+    import market_beta
+except ImportError:
+    indicators = market_beta = None
+
 # 数据库设置
 DATABASE_NAME = "kline.db"
 WATCHLIST_FILE = "watchlist.txt"
-ALL_ITEMS_CACHE_FILE = "all_items_cache.json"
 
 # API设置
 API_URL = 'https://api.steamdt.com/user/steam/category/v1/kline'
@@ -18,38 +30,27 @@ HEADERS = {
     'Referer': 'https://steamdt.com/'
 }
 
-def load_all_items_cache() -> Dict[str, str]:
-    """加载all_items_cache.json并建立market_hash_name到C5平台typeVal的映射"""
-    if not os.path.exists(ALL_ITEMS_CACHE_FILE):
-        print(f"❌ 错误：找不到all_items_cache文件 '{ALL_ITEMS_CACHE_FILE}'")
+# 并发采集设置
+MAX_WORKERS = 4  # 同时进行请求的线程数
+REQUESTS_PER_SECOND = 1 / 3  # 所有线程共享的请求配额（与原先每个请求后等待3秒的节奏一致）
+
+# 增量采集设置
+BACKFILL_START = 1735488000  # 2025.1.1的时间戳，新物品从此处开始回补历史数据
+BACKFILL_MERGE_DAYS = 7  # 缺口补采时，间隔不超过该天数的相邻缺口合并为一次请求
+
+def load_typeval_mapping(item_names: List[str]) -> Dict[str, str]:
+    """从物品目录查询market_hash_name到C5平台typeVal的映射"""
+    if not item_catalog.ensure_catalog():
+        print("❌ 错误：物品目录为空，请先运行 get_all_items.py")
         return {}
     
-    mapping = {}
     try:
-        with open(ALL_ITEMS_CACHE_FILE, 'r', encoding='utf-8') as f:
-            items_data = json.load(f)
-            
-        for item in items_data:
-            market_hash_name = item.get('marketHashName')
-            platform_list = item.get('platformList', [])
-            
-            if market_hash_name:
-                # 在platformList中查找name为C5的平台
-                for platform in platform_list:
-                    if platform.get('name') == 'C5':
-                        type_val = platform.get('itemId')
-                        if type_val:
-                            mapping[market_hash_name] = type_val
-                            break
-        
+        mapping = item_catalog.get_platform_item_ids(item_names, 'C5')
         print(f"✅ 已加载 {len(mapping)} 个物品的C5平台typeVal映射")
         return mapping
         
-    except json.JSONDecodeError as e:
-        print(f"❌ 解析all_items_cache文件失败: {e}")
-        return {}
-    except Exception as e:
-        print(f"❌ 加载all_items_cache文件时发生错误: {e}")
+    except sqlite3.Error as e:
+        print(f"❌ 查询物品目录时发生错误: {e}")
         return {}
 
 def load_watchlist() -> List[str]:
@@ -66,109 +67,76 @@ def load_watchlist() -> List[str]:
 
 def create_database():
     """创建kline数据库和表"""
-    conn = None
     try:
-        conn = sqlite3.connect(DATABASE_NAME)
-        cursor = conn.cursor()
+        with storage.transaction(DATABASE_NAME) as cursor:
+            # 创建kline_data表
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS kline_data (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                market_hash_name TEXT NOT NULL,
+                type_val TEXT NOT NULL,
+                timestamp INTEGER NOT NULL,
+                open_price REAL NOT NULL,
+                close_price REAL NOT NULL,
+                high_price REAL NOT NULL,
+                low_price REAL NOT NULL,
+                volume REAL NOT NULL,
+                turnover REAL NOT NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+            ''')
         
-        # 创建kline_data表
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS kline_data (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            market_hash_name TEXT NOT NULL,
-            type_val TEXT NOT NULL,
-            timestamp INTEGER NOT NULL,
-            open_price REAL NOT NULL,
-            close_price REAL NOT NULL,
-            high_price REAL NOT NULL,
-            low_price REAL NOT NULL,
-            volume REAL NOT NULL,
-            turnover REAL NOT NULL,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
+            # 创建索引以提高查询性能
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_type_val ON kline_data(type_val)')
         
-        # 创建索引以提高查询性能
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_market_timestamp ON kline_data(market_hash_name, timestamp)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_type_val ON kline_data(type_val)')
+            # (market_hash_name, timestamp) 唯一约束，旧数据库需先去重再建立
+            migrate_unique_constraint(cursor)
         
-        conn.commit()
         print("✅ 数据库初始化成功")
         
     except sqlite3.Error as e:
         print(f"❌ 数据库操作失败: {e}")
-    finally:
-        if conn:
-            conn.close()
 
-def get_latest_timestamp(market_hash_name: str) -> Optional[int]:
-    """获取指定物品的最新时间戳"""
-    conn = None
+def migrate_unique_constraint(cursor):
+    """
+    为kline_data建立 (market_hash_name, timestamp) 唯一索引
+    旧版本数据库只有普通索引，可能存在重复行：保留每组中id最小的一行后再建立唯一索引，
+    唯一索引同时覆盖了原有的 idx_market_timestamp，因此将其删除。
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'uq_market_timestamp'")
+    if cursor.fetchone():
+        return
+    
+    cursor.execute('''
+    DELETE FROM kline_data WHERE id NOT IN (
+        SELECT MIN(id) FROM kline_data GROUP BY market_hash_name, timestamp
+    )
+    ''')
+    if cursor.rowcount > 0:
+        print(f"🧹 已删除 {cursor.rowcount} 条重复的K线数据")
+    
+    cursor.execute('CREATE UNIQUE INDEX uq_market_timestamp ON kline_data(market_hash_name, timestamp)')
+    cursor.execute('DROP INDEX IF EXISTS idx_market_timestamp')
+    print("✅ 已建立 (market_hash_name, timestamp) 唯一约束")
+
+def get_latest_timestamps() -> Dict[str, int]:
+    """一次分组查询获取所有物品的最新时间戳，作为各物品的增量采集起点"""
     try:
-        conn = sqlite3.connect(DATABASE_NAME)
-        cursor = conn.cursor()
-        
+        cursor = storage.get_connection(DATABASE_NAME).cursor()
         cursor.execute('''
-        SELECT MAX(timestamp) FROM kline_data 
-        WHERE market_hash_name = ?
-        ''', (market_hash_name,))
-        
-        result = cursor.fetchone()
-        return result[0] if result[0] is not None else None
+        SELECT market_hash_name, MAX(timestamp) FROM kline_data 
+        GROUP BY market_hash_name
+        ''')
+        return dict(cursor.fetchall())
         
     except sqlite3.Error as e:
         print(f"❌ 查询最新时间戳失败: {e}")
-        return None
-    finally:
-        if conn:
-            conn.close()
-
-def is_database_empty() -> bool:
-    """检查数据库是否为空"""
-    conn = None
-    try:
-        conn = sqlite3.connect(DATABASE_NAME)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT COUNT(*) FROM kline_data')
-        count = cursor.fetchone()[0]
-        return count == 0
-        
-    except sqlite3.Error as e:
-        print(f"❌ 检查数据库状态失败: {e}")
-        return True
-    finally:
-        if conn:
-            conn.close()
-
-def adjust_to_beijing_midnight(timestamp_ms: int) -> int:
-    """
-    将时间戳调整为最近的过去北京时间24点（午夜0点）
-    北京时间 = UTC+8
-    """
-    # 将毫秒时间戳转换为秒
-    timestamp_sec = timestamp_ms // 1000
-    
-    # 转换为datetime对象（UTC时间）
-    dt_utc = datetime.fromtimestamp(timestamp_sec, timezone.utc)
-    
-    # 转换为北京时间（UTC+8）
-    dt_beijing = dt_utc + timedelta(hours=8)
-    
-    # 调整到北京时间的24点（午夜0点）- 总是过去的24点
-    dt_beijing_midnight = dt_beijing.replace(hour=0, minute=0, second=0, microsecond=0)
-    
-    # 转换回UTC时间戳
-    dt_utc_midnight = dt_beijing_midnight - timedelta(hours=8)
-    
-    # 返回毫秒时间戳
-    return int(dt_utc_midnight.timestamp() * 1000)
+        return {}
 
-def get_kline_data(type_val: str, max_time: Optional[int] = None) -> Optional[List]:
-    """获取K线数据"""
+def get_kline_data(type_val: str, max_time: Optional[int] = None, limiter: Optional[RateLimiter] = None) -> Optional[List]:
+    """获取K线数据，本地缓存有效时不发出请求，也不占用限速器配额"""
     # 直接将查询时间戳设置为过去最近的北京时间24点
-    current_timestamp = int(datetime.now(timezone.utc).timestamp() * 1000)
-    query_timestamp = adjust_to_beijing_midnight(current_timestamp)
+    query_timestamp = adjust_to_beijing_midnight(now_ms())
     
     query_params = {
         'timestamp': str(query_timestamp),
@@ -185,13 +153,14 @@ def get_kline_data(type_val: str, max_time: Optional[int] = None) -> Optional[Li
     
     try:
         print(f"正在请求typeVal: {type_val} 的K线数据...")
-        response = requests.get(API_URL, headers=HEADERS, params=query_params, timeout=30)
+        response = http_client.get(API_URL, 'kline', params=query_params, headers=HEADERS, timeout=30, limiter=limiter)
         response.raise_for_status()
         
         data = response.json()
         if data.get('success'):
             kline_list = data.get('data', [])
-            print(f"✅ 成功获取 {len(kline_list)} 条K线数据")
+            source = "（本地缓存）" if response.from_cache else ""
+            print(f"✅ 成功获取 {len(kline_list)} 条K线数据{source}")
             return kline_list
         else:
             print(f"❌ API返回错误: {data.get('errorMsg')}")
@@ -204,150 +173,254 @@ def get_kline_data(type_val: str, max_time: Optional[int] = None) -> Optional[Li
         print(f"❌ 处理数据时发生未知错误: {e}")
         return None
 
-def save_kline_data(market_hash_name: str, type_val: str, kline_data: List) -> int:
-    """保存K线数据到数据库"""
-    if not kline_data:
-        return 0
+def prepare_kline_rows(market_hash_name: str, type_val: str, kline_data: List) -> List[Tuple]:
+    """将API返回的K线数据转换为待写入kline_data的行"""
+    # 过滤掉最后一个实时数据（非每日数据），只保存完整日K线数据
+    if len(kline_data) > 1:
+        # 保存除最后一个外的所有历史日K线数据
+        historical_data = kline_data[:-1]
+    else:
+        # 如果只有一个数据，可能是历史数据，直接使用
+        historical_data = kline_data
     
-    conn = None
-    try:
-        conn = sqlite3.connect(DATABASE_NAME)
-        cursor = conn.cursor()
-        
-        total_saved = 0
+    rows = []
+    for daily_data in historical_data:
+        # 解析K线数据
+        timestamp_raw, open_price, close_price, high_price, low_price, volume, turnover = daily_data
         
-        # 过滤掉最后一个实时数据（非每日数据），只保存完整日K线数据
-        if len(kline_data) > 1:
-            # 保存除最后一个外的所有历史日K线数据
-            historical_data = kline_data[:-1]
-        else:
-            # 如果只有一个数据，可能是历史数据，直接使用
-            historical_data = kline_data
+        # 统一为秒级并调整到北京时间24点
+        timestamp_sec = beijing_midnight(to_milliseconds(timestamp_raw) // 1000)
         
-        # 按时间戳排序，从旧到新保存
-        sorted_data = sorted(historical_data, key=lambda x: int(x[0]))
+        # 处理可能为None或空值的情况
+        volume = volume if volume is not None and volume != '' else 0.0
+        turnover = turnover if turnover is not None and turnover != '' else 0.0
         
-        for daily_data in sorted_data:
-            # 解析K线数据
-            timestamp_raw, open_price, close_price, high_price, low_price, volume, turnover = daily_data
-            
-            # 转换时间戳为整数
-            timestamp_int = int(timestamp_raw)
-            
-            # 自动检测时间戳格式：如果数值小于2000000000，认为是秒级时间戳，否则是毫秒级
-            if timestamp_int < 3000000000:
-                # 秒级时间戳，需要转换为毫秒级
-                timestamp_ms = timestamp_int * 1000
-            else:
-                # 毫秒级时间戳
-                timestamp_ms = timestamp_int
-            
-            # 调整到北京时间24点
-            timestamp_sec = adjust_to_beijing_midnight(timestamp_ms) // 1000
-            
-            # 处理可能为None或空值的情况
-            volume = volume if volume is not None and volume != '' else 0.0
-            turnover = turnover if turnover is not None and turnover != '' else 0.0
-            
-            # 检查是否已存在该时间戳的数据
-            cursor.execute('''
-            SELECT COUNT(*) FROM kline_data 
-            WHERE market_hash_name = ? AND timestamp = ?
-            ''', (market_hash_name, timestamp_sec))
-            
-            if cursor.fetchone()[0] > 0:
-                continue  # 跳过已存在的数据
-            
-            # 插入新数据
-            cursor.execute('''
+        rows.append((market_hash_name, type_val, timestamp_sec, open_price, close_price, high_price, low_price, volume, turnover))
+    
+    # 按时间戳排序，从旧到新保存
+    rows.sort(key=lambda row: row[2])
+    return rows
+
+def save_kline_rows(rows: List[Tuple]) -> int:
+    """
+    通过一次 executemany 批量写入K线数据行，返回实际新增的行数
+    已存在的 (market_hash_name, timestamp) 由唯一约束跳过，无需逐行查询。
+    """
+    if not rows:
+        return 0
+    
+    try:
+        with storage.transaction(DATABASE_NAME) as cursor:
+            cursor.executemany('''
             INSERT INTO kline_data 
             (market_hash_name, type_val, timestamp, open_price, close_price, high_price, low_price, volume, turnover)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (market_hash_name, type_val, timestamp_sec, open_price, close_price, high_price, low_price, volume, turnover))
-            
-            total_saved += 1
-        
-        conn.commit()
-        if total_saved > 0:
-            print(f"✅ 已保存 {market_hash_name} 的 {total_saved} 条K线数据")
-        else:
-            print(f"⚠️  {market_hash_name} 无新数据需要保存")
-        return total_saved
+            ON CONFLICT(market_hash_name, timestamp) DO NOTHING
+            ''', rows)
+            return cursor.rowcount
         
     except sqlite3.Error as e:
         print(f"❌ 保存K线数据失败: {e}")
         return 0
-    finally:
-        if conn:
-            conn.close()
 
-def process_all_items():
-    """处理所有物品的K线数据"""
+def save_kline_data(market_hash_name: str, type_val: str, kline_data: List) -> int:
+    """保存K线数据到数据库"""
+    if not kline_data:
+        return 0
+    
+    total_saved = save_kline_rows(prepare_kline_rows(market_hash_name, type_val, kline_data))
+    
+    if total_saved > 0:
+        print(f"✅ 已保存 {market_hash_name} 的 {total_saved} 条K线数据")
+    else:
+        print(f"⚠️  {market_hash_name} 无新数据需要保存")
+    return total_saved
+
+def process_all_items(max_workers: int = MAX_WORKERS, requests_per_second: float = REQUESTS_PER_SECOND):
+    """
+    处理所有物品的K线数据
+    请求由线程池并发发出，所有线程共享同一个令牌桶限速器，保证总请求速率不超过配额；
+    数据库写入统一在主线程中完成。
+    """
     print("开始处理K线数据采集...")
     
     # 加载必要的数据
-    typeval_mapping = load_all_items_cache()
     watchlist = load_watchlist()
+    typeval_mapping = load_typeval_mapping(watchlist) if watchlist else {}
     
     if not typeval_mapping or not watchlist:
         print("❌ 无法加载必要数据，退出")
         return
     
-    # 检查数据库状态
-    is_empty = is_database_empty()
-    max_time = 1735488000 if is_empty else None  # 2025.1.1的时间戳
-    
-    if is_empty:
-        print("📊 首次创建数据库，将获取从2025.1.1至今的历史数据")
-    else:
-        print("📊 数据库已存在，将获取最新的增量数据")
-    
-    total_saved = 0
+    # 按物品确定增量起点：新物品从2025.1.1开始回补，已有物品只请求最新时间戳之后缺失的K线
+    latest_timestamps = get_latest_timestamps()
+    # 最近一根完整日K线的时间戳（今天的K线尚未收盘，不会被保存）
+    last_complete_timestamp = adjust_to_beijing_midnight(now_ms()) // 1000 - DAY_SECONDS
     
+    tasks = []
+    new_items = 0
+    up_to_date = 0
     for item_name in watchlist:
-        print(f"\n{'='*60}")
-        print(f"正在处理: {item_name}")
-        print('='*60)
-        
         if item_name not in typeval_mapping:
             print(f"❌ 找不到 {item_name} 的C5平台typeVal映射，跳过")
             continue
         
-        type_val = typeval_mapping[item_name]
-        
-        # 获取K线数据
-        kline_data = get_kline_data(type_val, max_time)
-        if not kline_data:
-            print(f"❌ 无法获取 {item_name} 的K线数据")
+        latest_timestamp = latest_timestamps.get(item_name)
+        if latest_timestamp is None:
+            max_time = BACKFILL_START
+            new_items += 1
+        elif latest_timestamp >= last_complete_timestamp:
+            up_to_date += 1
             continue
-        
-        # 保存数据
-        saved_count = save_kline_data(item_name, type_val, kline_data)
-        total_saved += saved_count
-        
-        if saved_count > 0:
-            print(f"✅ {item_name} 处理完成")
         else:
-            print(f"⚠️  {item_name} 无新数据需要保存")
+            max_time = latest_timestamp + DAY_SECONDS
+        tasks.append((item_name, typeval_mapping[item_name], max_time))
+    
+    print(f"📊 需要请求 {len(tasks)} 个物品（其中 {new_items} 个新物品将从2025.1.1开始回补），{up_to_date} 个物品已是最新")
+    
+    print(f"🚀 并发线程数: {max_workers}，请求配额: {requests_per_second:.2f} 请求/秒")
+    
+    limiter = RateLimiter(requests_per_second)
+    stats = RunStats(lambda: http_client.request_counts('kline'))
+    total_saved = 0
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(get_kline_data, type_val, max_time, limiter): (item_name, type_val)
+            for item_name, type_val, max_time in tasks
+        }
         
-        # 添加延迟以避免API频率限制
-        import time
-        time.sleep(3)
+        for future in as_completed(futures):
+            item_name, type_val = futures[future]
+            print(f"\n{'='*60}")
+            print(f"正在处理: {item_name}")
+            print('='*60)
+            
+            kline_data = future.result()
+            if not kline_data:
+                print(f"❌ 无法获取 {item_name} 的K线数据")
+                continue
+            
+            # 保存数据
+            saved_count = save_kline_data(item_name, type_val, kline_data)
+            total_saved += saved_count
+            
+            if saved_count > 0:
+                print(f"✅ {item_name} 处理完成")
+            else:
+                print(f"⚠️  {item_name} 无新数据需要保存")
     
     print(f"\n{'='*60}")
     print(f"处理完成！总共保存了 {total_saved} 条K线数据")
+    print(f"⏱️  {stats.summary()}")
+    http_client.print_request_stats()
+    print('='*60)
+
+def merge_gap_windows(ranges: List[Tuple[int, int]], merge_days: int = BACKFILL_MERGE_DAYS) -> List[Tuple[int, int]]:
+    """将一个物品的缺口区间去重、排序，并把间隔不超过 merge_days 天的相邻缺口合并为一个请求窗口"""
+    windows = []
+    for start, end in sorted(set(ranges)):
+        if windows and start - windows[-1][1] <= merge_days * DAY_SECONDS:
+            windows[-1] = (windows[-1][0], max(windows[-1][1], end))
+        else:
+            windows.append((start, end))
+    return windows
+
+def backfill_item(market_hash_name: str, type_val: str, windows: List[Tuple[int, int]],
+                  limiter: RateLimiter) -> List[Tuple]:
+    """
+    在工作线程中补采一个物品的缺口窗口，返回待写入的K线行
+    每个窗口以其起点作为maxTime请求；若某次返回的数据已覆盖后续窗口，则跳过这些窗口不再请求。
+    """
+    rows = []
+    covered_until = None
+    for start, end in windows:
+        if covered_until is not None and end <= covered_until:
+            continue
+        kline_data = get_kline_data(type_val, start, limiter)
+        if not kline_data:
+            print(f"❌ 无法获取 {market_hash_name} 从 {check_continuity.format_date(start)} 开始的K线数据")
+            continue
+        window_rows = prepare_kline_rows(market_hash_name, type_val, kline_data)
+        if window_rows and window_rows[0][2] <= start:
+            covered_until = window_rows[-1][2]
+        rows.extend(window_rows)
+    return rows
+
+def backfill_gaps(missing_ranges: List[Tuple[str, int, int, int]], max_workers: int = MAX_WORKERS,
+                  requests_per_second: float = REQUESTS_PER_SECOND):
+    """根据 check_continuity 找出的缺口，只请求缺失的时间窗口进行补采"""
+    gaps = check_continuity.group_by_item(missing_ranges)
+    if not gaps:
+        print("✅ 没有需要补采的缺口")
+        return
+    
+    typeval_mapping = load_typeval_mapping(list(gaps))
+    tasks = []
+    for item_name, ranges in gaps.items():
+        if item_name not in typeval_mapping:
+            print(f"❌ 找不到 {item_name} 的C5平台typeVal映射，跳过")
+            continue
+        tasks.append((item_name, typeval_mapping[item_name], merge_gap_windows(ranges)))
+    
+    window_count = sum(len(windows) for _, _, windows in tasks)
+    print(f"📊 {len(missing_ranges)} 个缺口合并为 {len(tasks)} 个物品的 {window_count} 个请求窗口")
+    
+    limiter = RateLimiter(requests_per_second)
+    stats = RunStats(lambda: http_client.request_counts('kline'))
+    total_saved = 0
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(backfill_item, item_name, type_val, windows, limiter): item_name
+            for item_name, type_val, windows in tasks
+        }
+        for future in as_completed(futures):
+            item_name = futures[future]
+            saved_count = save_kline_rows(future.result())
+            total_saved += saved_count
+            print(f"✅ {item_name} 补采了 {saved_count} 条K线数据")
+    
+    print(f"\n{'='*60}")
+    print(f"补采完成！总共保存了 {total_saved} 条K线数据")
+    print(f"⏱️  {stats.summary()}")
+    http_client.print_request_stats()
     print('='*60)
 
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="K线数据采集")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help="并发请求线程数")
+    parser.add_argument('--rate', type=float, default=REQUESTS_PER_SECOND, help="所有线程共享的请求配额（请求/秒）")
+    parser.add_argument('--backfill', nargs='?', const='', metavar='GAPS_CSV',
+                        help="只补采缺失的日K线；可指定 check_continuity.py --output 生成的缺口列表，否则现场检测")
+    parser.add_argument('--no-indicators', action='store_true', help="采集完成后不更新技术指标和市场Beta")
+    args = parser.parse_args()
+    
     print("K线数据采集系统")
     print("="*60)
     
     # 创建数据库
     create_database()
     
-    # 处理所有物品
-    process_all_items()
+    if args.backfill is not None:
+        # 补采缺口
+        if args.backfill:
+            missing_ranges = check_continuity.read_csv(args.backfill)
+        else:
+            missing_ranges = check_continuity.find_missing_ranges()
+        backfill_gaps(missing_ranges, args.workers, args.rate)
+    else:
+        # 处理所有物品
+        process_all_items(args.workers, args.rate)
+
+    # 只重算有新K线的物品
+    if not args.no_indicators:
+        if indicators is None:
+            print("⚠️ 未安装 numpy，跳过技术指标和市场Beta更新")
+        else:
+            indicators.update_indicators()
+            market_beta.update_betas()
     
     print("\n🎉 K线数据采集完成")
 
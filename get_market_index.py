@@ -1,11 +1,17 @@
 import requests
 import sqlite3
 import time
-from datetime import datetime, timezone, timedelta
 from typing import Dict, List, Optional
 
+import http_client
+import storage
+from time_utils import BEIJING_OFFSET_SECONDS, DAY_SECONDS, adjust_to_beijing_midnight, beijing_midnight, now_ms, to_milliseconds
+
 # 数据库设置
 DATABASE_NAME = "market_index.db"
+# 数据库迁移版本（PRAGMA user_version）
+SCHEMA_TIMESTAMPS_NORMALIZED = 1  # 已有时间戳已调整到北京24点
+SCHEMA_UNIQUE_TIMESTAMP = 2  # timestamp 唯一约束
 
 # API设置
 API_URL = 'https://api.steamdt.com/user/statistics/v2/chart'
@@ -16,72 +22,26 @@ HEADERS = {
 
 def create_database():
     """创建market_index数据库和表"""
-    conn = None
     try:
-        conn = sqlite3.connect(DATABASE_NAME)
-        cursor = conn.cursor()
-        
-        # 创建market_index表
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS market_index (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            index_value REAL NOT NULL,
-            timestamp INTEGER NOT NULL,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        # 创建索引以提高查询性能
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON market_index(timestamp)')
-        
-        conn.commit()
+        with storage.transaction(DATABASE_NAME) as cursor:
+            # 创建market_index表
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS market_index (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                index_value REAL NOT NULL,
+                timestamp INTEGER NOT NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+            ''')
         print("✅ 数据库初始化成功")
         
     except sqlite3.Error as e:
         print(f"❌ 数据库操作失败: {e}")
-    finally:
-        if conn:
-            conn.close()
-
-def save_index_to_db(index_value, timestamp):
-    """将大盘指数保存到数据库"""
-    conn = None
-    try:
-        conn = sqlite3.connect(DATABASE_NAME)
-        cursor = conn.cursor()
-        
-        # 检查是否已存在该时间戳的数据
-        cursor.execute('''
-        SELECT COUNT(*) FROM market_index WHERE timestamp = ?
-        ''', (timestamp,))
-        
-        if cursor.fetchone()[0] > 0:
-            print(f"⚠️  时间戳 {timestamp} 的数据已存在，跳过")
-            return False
-        
-        cursor.execute('''
-        INSERT INTO market_index (index_value, timestamp)
-        VALUES (?, ?)
-        ''', (index_value, timestamp))
-        
-        conn.commit()
-        print(f"✅ 大盘指数 {index_value} (时间戳: {timestamp}) 已保存到数据库")
-        return True
-        
-    except sqlite3.Error as e:
-        print(f"❌ 保存数据失败: {e}")
-        return False
-    finally:
-        if conn:
-            conn.close()
 
 def get_latest_timestamp():
     """获取数据库中最新的时间戳"""
-    conn = None
     try:
-        conn = sqlite3.connect(DATABASE_NAME)
-        cursor = conn.cursor()
-        
+        cursor = storage.get_connection(DATABASE_NAME).cursor()
         cursor.execute('SELECT MAX(timestamp) FROM market_index')
         result = cursor.fetchone()
         return result[0] if result[0] is not None else None
@@ -89,56 +49,22 @@ def get_latest_timestamp():
     except sqlite3.Error as e:
         print(f"❌ 查询最新时间戳失败: {e}")
         return None
-    finally:
-        if conn:
-            conn.close()
 
 def is_database_empty():
     """检查数据库是否为空"""
-    conn = None
     try:
-        conn = sqlite3.connect(DATABASE_NAME)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT COUNT(*) FROM market_index')
-        count = cursor.fetchone()[0]
-        return count == 0
+        cursor = storage.get_connection(DATABASE_NAME).cursor()
+        cursor.execute('SELECT 1 FROM market_index LIMIT 1')
+        return cursor.fetchone() is None
         
     except sqlite3.Error as e:
         print(f"❌ 检查数据库状态失败: {e}")
         return True
-    finally:
-        if conn:
-            conn.close()
-
-def adjust_to_beijing_midnight(timestamp_ms: int) -> int:
-    """
-    将时间戳调整为最近的过去北京时间24点（午夜0点）
-    北京时间 = UTC+8
-    """
-    # 将毫秒时间戳转换为秒
-    timestamp_sec = timestamp_ms // 1000
-    
-    # 转换为datetime对象（UTC时间）
-    dt_utc = datetime.fromtimestamp(timestamp_sec, timezone.utc)
-    
-    # 转换为北京时间（UTC+8）
-    dt_beijing = dt_utc + timedelta(hours=8)
-    
-    # 调整到北京时间的24点（午夜0点）- 总是过去的24点
-    dt_beijing_midnight = dt_beijing.replace(hour=0, minute=0, second=0, microsecond=0)
-    
-    # 转换回UTC时间戳
-    dt_utc_midnight = dt_beijing_midnight - timedelta(hours=8)
-    
-    # 返回毫秒时间戳
-    return int(dt_utc_midnight.timestamp() * 1000)
 
 def get_market_index_data() -> Optional[List]:
     """获取大盘指数数据"""
     # 直接将查询时间戳设置为过去最近的北京时间24点
-    current_timestamp = int(datetime.now(timezone.utc).timestamp() * 1000)
-    query_timestamp = adjust_to_beijing_midnight(current_timestamp)
+    query_timestamp = adjust_to_beijing_midnight(now_ms())
     
     query_params = {
         'timestamp': str(query_timestamp),
@@ -148,13 +74,14 @@ def get_market_index_data() -> Optional[List]:
     
     try:
         print(f"正在请求大盘指数数据...")
-        response = requests.get(API_URL, headers=HEADERS, params=query_params, timeout=30)
+        response = http_client.get(API_URL, 'chart', params=query_params, headers=HEADERS, timeout=30)
         response.raise_for_status()
         
         data = response.json()
         if data.get('success'):
             index_list = data.get('data', [])
-            print(f"✅ 成功获取 {len(index_list)} 条大盘指数数据")
+            source = "（本地缓存）" if response.from_cache else ""
+            print(f"✅ 成功获取 {len(index_list)} 条大盘指数数据{source}")
             return index_list
         else:
             print(f"❌ API返回错误: {data.get('errorMsg')}")
@@ -168,70 +95,86 @@ def get_market_index_data() -> Optional[List]:
         return None
 
 def adjust_existing_timestamps():
-    """调整现有数据库中的时间戳到最接近的北京24点"""
-    conn = None
+    """
+    调整现有数据库中的时间戳到最接近的北京24点
+    用一条UPDATE语句以整数运算完成；完成后记录迁移版本号，之后的运行不再重复执行。
+    """
     try:
-        conn = sqlite3.connect(DATABASE_NAME)
-        cursor = conn.cursor()
-        
-        # 获取所有现有数据
-        cursor.execute('SELECT id, index_value, timestamp FROM market_index ORDER BY timestamp')
-        existing_data = cursor.fetchall()
-        
-        updated_count = 0
-        
-        for record_id, index_value, old_timestamp in existing_data:
-            # 调整时间戳
-            adjusted_timestamp = adjust_to_beijing_midnight(old_timestamp * 1000) // 1000
+        with storage.transaction(DATABASE_NAME) as cursor:
+            if storage.get_schema_version(cursor) >= SCHEMA_TIMESTAMPS_NORMALIZED:
+                return
             
-            # 如果时间戳有变化，则更新
-            if adjusted_timestamp != old_timestamp:
-                cursor.execute('''
-                UPDATE market_index 
-                SET timestamp = ? 
-                WHERE id = ?
-                ''', (adjusted_timestamp, record_id))
-                updated_count += 1
+            cursor.execute(f'''
+            UPDATE market_index 
+            SET timestamp = timestamp - (timestamp + {BEIJING_OFFSET_SECONDS}) % {DAY_SECONDS}
+            WHERE (timestamp + {BEIJING_OFFSET_SECONDS}) % {DAY_SECONDS} != 0
+            ''')
+            updated_count = cursor.rowcount
+            storage.set_schema_version(cursor, SCHEMA_TIMESTAMPS_NORMALIZED)
         
-        conn.commit()
         print(f"✅ 已调整 {updated_count} 条记录的时间戳到最接近的北京24点")
         
     except sqlite3.Error as e:
         print(f"❌ 调整时间戳失败: {e}")
-    finally:
-        if conn:
-            conn.close()
+
+def migrate_unique_timestamp():
+    """
+    为market_index建立timestamp唯一索引（需在时间戳调整之后执行）
+    同一时间戳的重复行只保留最早写入的一行，唯一索引同时取代原有的 idx_timestamp。
+    """
+    try:
+        with storage.transaction(DATABASE_NAME) as cursor:
+            if storage.get_schema_version(cursor) >= SCHEMA_UNIQUE_TIMESTAMP:
+                return
+            
+            cursor.execute('''
+            DELETE FROM market_index WHERE id NOT IN (
+                SELECT MIN(id) FROM market_index GROUP BY timestamp
+            )
+            ''')
+            if cursor.rowcount > 0:
+                print(f"🧹 已删除 {cursor.rowcount} 条重复的大盘指数数据")
+            
+            cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS uq_timestamp ON market_index(timestamp)')
+            cursor.execute('DROP INDEX IF EXISTS idx_timestamp')
+            storage.set_schema_version(cursor, SCHEMA_UNIQUE_TIMESTAMP)
+        
+        print("✅ 已建立 timestamp 唯一约束")
+        
+    except sqlite3.Error as e:
+        print(f"❌ 建立唯一约束失败: {e}")
 
 def save_market_index_data(index_data: List) -> int:
-    """保存大盘指数数据到数据库"""
+    """
+    保存大盘指数数据到数据库
+    整个序列在一个事务中通过 executemany 写入，已存在的时间戳由唯一约束跳过。
+    返回新增的条数。
+    """
     if not index_data:
         return 0
     
-    total_saved = 0
-    
-    # 按时间戳排序，从旧到新保存
+    # 统一为秒级并调整到北京时间24点，按时间戳从旧到新保存
     sorted_data = sorted(index_data, key=lambda x: int(x[0]))
+    rows = [
+        (index_value, beijing_midnight(to_milliseconds(timestamp_raw) // 1000))
+        for timestamp_raw, index_value in sorted_data
+    ]
     
-    for timestamp_raw, index_value in sorted_data:
-        # 转换时间戳为整数
-        timestamp_int = int(timestamp_raw)
-        
-        # 自动检测时间戳格式：如果数值小于2000000000，认为是秒级时间戳，否则是毫秒级
-        if timestamp_int < 3000000000:
-            # 秒级时间戳，需要转换为毫秒级
-            timestamp_ms = timestamp_int * 1000
-        else:
-            # 毫秒级时间戳
-            timestamp_ms = timestamp_int
+    try:
+        with storage.transaction(DATABASE_NAME) as cursor:
+            cursor.executemany('''
+            INSERT INTO market_index (index_value, timestamp)
+            VALUES (?, ?)
+            ON CONFLICT(timestamp) DO NOTHING
+            ''', rows)
+            inserted = cursor.rowcount
         
-        # 调整到北京时间24点
-        timestamp_sec = adjust_to_beijing_midnight(timestamp_ms) // 1000
+        print(f"✅ 新增 {inserted} 条大盘指数数据，跳过 {len(rows) - inserted} 条已存在的数据")
+        return inserted
         
-        # 直接保存，跳过已存在的
-        if save_index_to_db(index_value, timestamp_sec):
-            total_saved += 1
-    
-    return total_saved
+    except sqlite3.Error as e:
+        print(f"❌ 保存数据失败: {e}")
+        return 0
 
 def main():
     """主函数"""
@@ -244,6 +187,7 @@ def main():
     # 调整现有数据库中的时间戳到最接近的北京24点
     print("🔄 调整现有数据时间戳...")
     adjust_existing_timestamps()
+    migrate_unique_timestamp()
     
     # 检查数据库状态
     is_empty = is_database_empty()
@@ -265,6 +209,7 @@ def main():
     print(f"\n{'='*60}")
     print(f"处理完成！总共保存了 {total_saved} 条大盘指数数据")
     print('='*60)
+    http_client.print_request_stats()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,22 +1,44 @@
 # -*- coding: utf-8 -*-
+import argparse
 import requests
 import json
 import os
+import random
 import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+
+import http_client
+import storage
+from time_utils import to_milliseconds
+from database_setup import SQL_UPSERT_LATEST_PRICE, ensure_schema, intern_items, intern_platforms, parse_sales_volume, to_cents
 try:
     from config import API_KEY
 except ImportError:
     API_KEY = ""
 
 # 导入成交量获取功能
-from get_sales import get_multiple_items_sales_volume
+from get_sales import get_multiple_items_sales_volume, iter_items_sales_volume
+from price_rollup import RAW_RETENTION_DAYS, run_rollups
+
+try:
+    import spread_scanner  # 可选依赖：跨平台价差扫描需要 numpy
+except ImportError:
+    spread_scanner = None
 
 # --- 全局设置 ---
 DATABASE_NAME = "csgo_market_data.db"
 BASE_URL = "https://open.steamdt.com"
 HEADERS = {"Authorization": f"Bearer {API_KEY}", "Content-Type": "application/json"}
 WATCHLIST_FILE = "watchlist.txt"
+PIPELINE_BATCH_SIZE = 20  # 流水线模式下每凑满多少条记录写入一次数据库
+
+# 批量价格查询设置
+PRICE_CHUNK_SIZE = 100  # 每次请求 /price/batch 的饰品数量上限
+PRICE_MAX_WORKERS = 4  # 同时发送的分块请求数
+PRICE_MAX_RETRIES = 3  # API返回错误时每个分块的最大重试次数
+PRICE_RETRY_BACKOFF = 2.0  # 首次重试前的等待秒数，之后按指数增长
 
 # read_watchlist, get_prices_batch, filter_price_data 函数与上一版完全相同，此处省略以保持简洁
 # 您可以直接复用上一版中的这三个函数，无需修改
@@ -31,25 +53,65 @@ def read_watchlist(filepath: str) -> list[str]:
         item_names = [line for line in lines if line and not line.startswith('#')]
     return item_names
 
-def get_prices_batch(market_hash_names: list[str]):
-    """通过 'marketHashName' 批量查询饰品价格。"""
-    if not market_hash_names: return None
-    print(f"ℹ️  准备为 {len(market_hash_names)} 个饰品批量查询价格...")
+def fetch_price_chunk(market_hash_names: list[str], chunk_label: str = ""):
+    """
+    请求一个分块的价格数据，最终失败返回None。
+    网络错误和429/5xx由 http_client 退避重试；API返回 success:false 时在此按指数退避重试。
+    """
     endpoint = "/open/cs2/v1/price/batch"
     payload = {"marketHashNames": market_hash_names}
-    try:
-        response = requests.post(BASE_URL + endpoint, headers=HEADERS, json=payload, timeout=30)
-        response.raise_for_status()
-        data = response.json()
-        if data.get("success"):
-            print("✅ API价格查询成功。")
-            return data.get("data", [])
-        else:
-            print(f"❌ API返回错误：{data.get('errorMsg')}")
+    for attempt in range(PRICE_MAX_RETRIES + 1):
+        if attempt > 0:
+            delay = PRICE_RETRY_BACKOFF * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+            print(f"🔁 {chunk_label} 第 {attempt} 次重试，等待 {delay:.1f} 秒...")
+            time.sleep(delay)
+        try:
+            response = http_client.post(BASE_URL + endpoint, 'price', headers=HEADERS, json=payload, timeout=30)
+            if response.status_code >= 400:
+                # 4xx请求本身有误，429/5xx已在 http_client 中重试耗尽
+                print(f"❌ {chunk_label} 请求失败：HTTP {response.status_code}")
+                return None
+            data = response.json()
+            if data.get("success"):
+                return data.get("data", [])
+            print(f"❌ {chunk_label} API返回错误：{data.get('errorMsg')}")
+        except requests.exceptions.RequestException as e:
+            print(f"❌ {chunk_label} 请求API时发生网络错误：{e}")
             return None
-    except requests.exceptions.RequestException as e:
-        print(f"❌ 请求API时发生网络错误：{e}")
+    return None
+
+def get_prices_batch(market_hash_names: list[str], chunk_size: int = PRICE_CHUNK_SIZE, max_workers: int = PRICE_MAX_WORKERS):
+    """
+    通过 'marketHashName' 批量查询饰品价格。
+    名单按 chunk_size 切分后并发请求，合并所有成功分块的结果；全部分块失败时返回None。
+    """
+    if not market_hash_names: return None
+    chunks = [market_hash_names[i:i + chunk_size] for i in range(0, len(market_hash_names), chunk_size)]
+    print(f"ℹ️  准备为 {len(market_hash_names)} 个饰品批量查询价格（{len(chunks)} 个分块）...")
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(
+            lambda args: fetch_price_chunk(args[1], f"分块 {args[0] + 1}/{len(chunks)}"),
+            enumerate(chunks),
+        ))
+    
+    merged = []
+    failed_chunks = []
+    for index, (chunk, result) in enumerate(zip(chunks, results)):
+        if result is None:
+            failed_chunks.append((index, chunk))
+        else:
+            merged.extend(result)
+    
+    if failed_chunks:
+        failed_names = sum(len(chunk) for _, chunk in failed_chunks)
+        print(f"⚠️  {len(failed_chunks)}/{len(chunks)} 个分块查询失败，共 {failed_names} 个饰品缺少价格：")
+        for index, chunk in failed_chunks:
+            print(f"    分块 {index + 1}: {chunk[0]} ... {chunk[-1]}（{len(chunk)} 个）")
+    if len(failed_chunks) == len(chunks):
         return None
+    print(f"✅ API价格查询成功：{len(chunks) - len(failed_chunks)}/{len(chunks)} 个分块，{len(merged)} 条结果。")
+    return merged
 
 def filter_price_data(price_data: list) -> list:
     """根据指定规则筛选价格数据：使用YOUPIN的sell_price和BUFF的bidding_price。"""
@@ -105,91 +167,272 @@ def filter_price_data(price_data: list) -> list:
     print(f"✅ 数据筛选完成，有效数据：{len(filtered_list)}条")
     return filtered_list
 
-def save_data_to_db(filtered_data: list, sales_volume_data: dict = None):
+def save_data_to_db(filtered_data: list, sales_volume_data: dict = None, snapshot_timestamp: int = None):
     """
-    将筛选后的数据保存到 SQLite 数据库的 'price_history' 表，包含成交量信息。
+    将筛选后的数据保存到 SQLite 数据库的价格快照表，包含成交量信息。
+    饰品和平台名称映射为整数ID，价格以分为单位存储，未能获取的成交量存为NULL。
+    同一事务中更新 latest_price，最新价格表与快照始终一致。
+    snapshot_timestamp 为价格快照的时间，未指定时使用写入时刻。
     """
     if not filtered_data:
         print("ℹ️  没有数据可以保存到数据库。")
         return
 
-    conn = None
     try:
-        conn = sqlite3.connect(DATABASE_NAME)
-        cursor = conn.cursor()
-        
-        # 检查是否存在sales_volume列，如果不存在则添加
-        cursor.execute("PRAGMA table_info(price_history)")
-        columns = [column[1] for column in cursor.fetchall()]
-        
-        if 'sales_volume' not in columns:
-            cursor.execute("ALTER TABLE price_history ADD COLUMN sales_volume TEXT")
-            conn.commit()
-            print("✅ 已添加sales_volume列到数据库表")
+        ensure_schema(storage.get_connection(DATABASE_NAME))
         
-        print(f"ℹ️  正在将 {len(filtered_data)} 条筛选后的饰品数据写入数据库...")
-        
-        current_timestamp = int(datetime.now().timestamp())
-        
-        records_to_insert = []
-        for item in filtered_data:
-            market_hash_name = item['marketHashName']
-            # 获取该饰品的成交量数据
-            sales_volume = sales_volume_data.get(market_hash_name, "未能获取") if sales_volume_data else "未能获取"
+        with storage.transaction(DATABASE_NAME) as cursor:
+            print(f"ℹ️  正在将 {len(filtered_data)} 条筛选后的饰品数据写入数据库...")
+            
+            current_timestamp = snapshot_timestamp or int(datetime.now().timestamp())
+            
+            item_ids = intern_items(cursor, [item['marketHashName'] for item in filtered_data])
+            platform_ids = intern_platforms(cursor, [
+                platform_data.get('platform') for item in filtered_data for platform_data in item['dataList']
+            ])
             
-            for platform_data in item['dataList']:
-                # 准备一条要插入的记录（包含成交量）
-                record = (
-                    market_hash_name,
-                    current_timestamp,
-                    platform_data.get('platform'),
-                    platform_data.get('sellPrice'),
-                    platform_data.get('sellCount'),
-                    platform_data.get('biddingPrice'),
-                    platform_data.get('biddingCount'),
-                    sales_volume,
-                )
-                records_to_insert.append(record)
+            records_to_insert = []
+            for item in filtered_data:
+                market_hash_name = item['marketHashName']
+                # 获取该饰品的成交量数据
+                sales_volume = parse_sales_volume(sales_volume_data.get(market_hash_name)) if sales_volume_data else None
+                
+                for platform_data in item['dataList']:
+                    # 准备一条要插入的记录（包含成交量）
+                    record = (
+                        item_ids[market_hash_name],
+                        current_timestamp,
+                        platform_ids[platform_data.get('platform')],
+                        to_cents(platform_data.get('sellPrice')),
+                        platform_data.get('sellCount'),
+                        to_cents(platform_data.get('biddingPrice')),
+                        platform_data.get('biddingCount'),
+                        sales_volume,
+                    )
+                    records_to_insert.append(record)
+            
+            # 使用 executemany 批量插入，效率更高
+            if records_to_insert:
+                sql = """
+                INSERT OR REPLACE INTO price_snapshots (item_id, timestamp, platform_id, sell_price, sell_count, bidding_price, bidding_count, sales_volume)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """
+                cursor.executemany(sql, records_to_insert)
+                cursor.executemany(SQL_UPSERT_LATEST_PRICE, records_to_insert)
         
-        # 使用 executemany 批量插入，效率更高
         if records_to_insert:
-            sql = """
-            INSERT INTO price_history (market_hash_name, timestamp, platform, sell_price, sell_count, bidding_price, bidding_count, sales_volume)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """
-            cursor.executemany(sql, records_to_insert)
-            conn.commit()
             print(f"✅ 成功将 {len(records_to_insert)} 条价格记录（含成交量）写入数据库。")
 
     except sqlite3.Error as e:
         print(f"❌ 数据库操作失败: {e}")
-    finally:
-        if conn:
-            conn.close()
+
+def save_platform_quotes(price_data: list, snapshot_timestamp: int) -> int:
+    """
+    完整采集模式：将 /price/batch 返回的所有平台报价写入 platform_quotes，返回写入的条数
+    报价以平台的 updateTime（缺失时为快照时间）为键；与该平台上一条报价的价格和数量完全相同时跳过，
+    同一 updateTime 的报价只保留第一次写入的。platformItemId 写入 platform_item_ids，变化时更新。
+    """
+    if not price_data:
+        return 0
+
+    try:
+        ensure_schema(storage.get_connection(DATABASE_NAME))
+
+        with storage.transaction(DATABASE_NAME) as cursor:
+            item_ids = intern_items(cursor, [item['marketHashName'] for item in price_data])
+            platform_ids = intern_platforms(cursor, [
+                platform_data.get('platform') for item in price_data for platform_data in item.get('dataList') or []
+            ])
+
+            quotes = []
+            platform_item_ids = []
+            for item in price_data:
+                item_id = item_ids[item['marketHashName']]
+                for platform_data in item.get('dataList') or []:
+                    platform_id = platform_ids[platform_data.get('platform')]
+                    update_time = platform_data.get('updateTime')
+                    update_time = to_milliseconds(update_time) // 1000 if update_time else snapshot_timestamp
+                    quotes.append((
+                        item_id, platform_id, update_time,
+                        to_cents(platform_data.get('sellPrice')),
+                        platform_data.get('sellCount'),
+                        to_cents(platform_data.get('biddingPrice')),
+                        platform_data.get('biddingCount'),
+                    ))
+                    if platform_data.get('platformItemId'):
+                        platform_item_ids.append((item_id, platform_id, str(platform_data['platformItemId'])))
+
+            # 与时间上不晚于本条的最近一条报价比较，完全相同则不写入
+            cursor.executemany("""
+            INSERT OR IGNORE INTO platform_quotes
+            (item_id, platform_id, update_time, sell_price, sell_count, bidding_price, bidding_count)
+            SELECT ?1, ?2, ?3, ?4, ?5, ?6, ?7
+            WHERE NOT EXISTS (
+                SELECT 1 FROM (
+                    SELECT sell_price, sell_count, bidding_price, bidding_count FROM platform_quotes
+                    WHERE item_id = ?1 AND platform_id = ?2 AND update_time <= ?3
+                    ORDER BY update_time DESC LIMIT 1
+                ) AS previous
+                WHERE previous.sell_price IS ?4 AND previous.sell_count IS ?5
+                  AND previous.bidding_price IS ?6 AND previous.bidding_count IS ?7
+            )
+            """, quotes)
+            stored = cursor.rowcount
+            cursor.executemany("""
+            INSERT INTO platform_item_ids (item_id, platform_id, platform_item_id) VALUES (?, ?, ?)
+            ON CONFLICT(item_id, platform_id) DO UPDATE SET platform_item_id = excluded.platform_item_id
+            WHERE platform_item_id IS NOT excluded.platform_item_id
+            """, platform_item_ids)
+
+        print(f"✅ 完整采集：写入 {stored} 条平台报价，跳过 {len(quotes) - stored} 条未变化的报价")
+        return stored
+
+    except sqlite3.Error as e:
+        print(f"❌ 保存平台报价失败: {e}")
+        return 0
+
+def fetch_price_snapshot(market_hash_names: list[str], scan_spreads: bool = False, full_capture: bool = False):
+    """
+    批量查询并筛选价格，返回 (报价时间, {饰品名称: 筛选后的数据}, 价差机会)
+    scan_spreads 为True时在筛选前用全部平台的报价扫描跨平台价差，否则价差机会为None；
+    full_capture 为True时同时保存所有平台的原始报价。
+    """
+    raw_data = get_prices_batch(market_hash_names)
+    snapshot_timestamp = int(datetime.now().timestamp())
+    if full_capture and raw_data:
+        save_platform_quotes(raw_data, snapshot_timestamp)
+    opportunities = spread_scanner.scan(raw_data) if scan_spreads and raw_data else None
+    filtered_data = filter_price_data(raw_data) if raw_data else []
+    return snapshot_timestamp, {item['marketHashName']: item for item in filtered_data}, opportunities
+
+def run_sequential(target_items: list[str], scan_spreads: bool = False, full_capture: bool = False):
+    """先查询价格，再逐个获取成交量，最后一次性写入数据库；返回 (成交量数据, 价差机会)"""
+    try:
+        snapshot_timestamp, price_items, opportunities = fetch_price_snapshot(target_items, scan_spreads, full_capture)
+    except Exception as e:
+        print(f"❌ 获取价格数据失败，跳过成交量抓取: {e}")
+        return {}, None
+    if not price_items:
+        print("⚠️  没有可保存的价格数据，跳过成交量抓取")
+        return {}, opportunities
+    
+    # 获取成交量数据
+    print("\n" + "="*22 + " 开始获取饰品成交量数据 " + "="*22)
+    sales_volume_data = get_multiple_items_sales_volume(target_items)
+    
+    # 保存所有数据到数据库
+    save_data_to_db(list(price_items.values()), sales_volume_data, snapshot_timestamp)
+    return sales_volume_data, opportunities
+
+def run_pipeline(target_items: list[str], batch_size: int = PIPELINE_BATCH_SIZE, scan_spreads: bool = False,
+                 full_capture: bool = False):
+    """
+    价格查询与成交量抓取同时进行，返回 (成交量数据, 价差机会)
+    价格快照在后台线程中获取，时间戳取报价返回的时刻；每个饰品在价格和成交量都就绪后进入写入队列，
+    每凑满 batch_size 条写入一次数据库，不必等待全部页面抓取完成；
+    价格获取失败或没有可保存的价格时立即停止抓取成交量，与顺序模式一样不写入任何数据。
+    """
+    sales_volume_data = {}
+    scraped = set()
+    price_items = None
+    snapshot_timestamp = None
+    opportunities = None
+    batch = []
+    
+    def flush():
+        if batch:
+            save_data_to_db(batch, sales_volume_data, snapshot_timestamp)
+            batch.clear()
+    
+    def load_prices():
+        """读取价格快照的结果，获取失败或没有可保存的价格时返回False"""
+        nonlocal snapshot_timestamp, price_items, opportunities
+        try:
+            snapshot_timestamp, price_items, opportunities = price_future.result()
+        except Exception as e:
+            print(f"❌ 获取价格数据失败，停止抓取成交量: {e}")
+            return False
+        if not price_items:
+            print("⚠️  没有可保存的价格数据，停止抓取成交量")
+            return False
+        return True
+    
+    def take_ready(item_names):
+        for item_name in item_names:
+            if item_name in price_items:
+                batch.append(price_items.pop(item_name))
+        if len(batch) >= batch_size:
+            flush()
+    
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        price_future = executor.submit(fetch_price_snapshot, target_items, scan_spreads, full_capture)
+        
+        print("\n" + "="*22 + " 同时获取饰品成交量数据 " + "="*22)
+        volumes = iter_items_sales_volume(target_items)
+        try:
+            for item_name, volume in volumes:
+                scraped.add(item_name)
+                if volume:
+                    sales_volume_data[item_name] = volume
+                
+                if price_items is None:
+                    if price_future.done():
+                        if not load_prices():
+                            return {}, opportunities
+                        # 价格刚刚就绪：之前已抓取完成的饰品一并进入写入队列
+                        take_ready(list(scraped))
+                else:
+                    take_ready([item_name])
+        finally:
+            volumes.close()
+        
+        if price_items is None and not load_prices():
+            return {}, opportunities
+    
+    # 成交量全部抓取完毕，剩余的饰品一次写入
+    batch.extend(price_items.values())
+    flush()
+    return sales_volume_data, opportunities
 
 # --- 主程序执行区 ---
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="采集、筛选并存储价格数据（含成交量）")
+    parser.add_argument('--sequential', action='store_true', help="按顺序执行：先查询价格，再抓取成交量，最后统一写入")
+    parser.add_argument('--no-rollup', action='store_true', help="写入后不更新小时/日K线聚合")
+    parser.add_argument('--retention-days', type=int, default=RAW_RETENTION_DAYS,
+                        help="聚合后删除超过该天数的原始快照，默认永久保留")
+    parser.add_argument('--scan-spreads', action='store_true', help="用全部平台的报价扫描跨平台价差（扣除手续费）")
+    parser.add_argument('--full-capture', action='store_true', help="同时保存所有平台的原始报价（未变化的报价不重复写入）")
+    args = parser.parse_args()
+    
     print("\n" + "="*22 + " 任务：采集、筛选并存储价格数据（含成交量） " + "="*22)
     if not API_KEY:
         print("🛑 错误：请先在 config.py 文件中填写您的 API_KEY。")
     else:
         target_items = read_watchlist(WATCHLIST_FILE)
+        if args.scan_spreads and spread_scanner is None:
+            print("⚠️  未安装 numpy，跳过跨平台价差扫描")
+            args.scan_spreads = False
         if target_items:
-            # 获取价格数据
-            raw_data = get_prices_batch(target_items)
-            if raw_data:
-                filtered_data = filter_price_data(raw_data)
-                
-                # 获取成交量数据
-                print("\n" + "="*22 + " 开始获取饰品成交量数据 " + "="*22)
-                sales_volume_data = get_multiple_items_sales_volume(target_items)
-                
-                # 保存所有数据到数据库
-                save_data_to_db(filtered_data, sales_volume_data)
-                
-                # 显示成交量获取结果
-                print(f"\n{'='*22} 成交量获取结果汇总 {'='*22}")
-                for item, volume in sales_volume_data.items():
-                    print(f"{item}: {volume}")
+            if args.sequential:
+                sales_volume_data, opportunities = run_sequential(target_items, args.scan_spreads, args.full_capture)
+            else:
+                sales_volume_data, opportunities = run_pipeline(target_items, scan_spreads=args.scan_spreads,
+                                                                full_capture=args.full_capture)
+            
+            # 显示成交量获取结果
+            print(f"\n{'='*22} 成交量获取结果汇总 {'='*22}")
+            for item, volume in sales_volume_data.items():
+                print(f"{item}: {volume}")
+
+            if opportunities is not None:
+                print(f"\n{'='*22} 跨平台价差机会 {'='*22}")
+                spread_scanner.print_opportunities(opportunities)
+
+            http_client.print_request_stats()
+
+            if not args.no_rollup:
+                print(f"\n{'='*22} 更新价格聚合K线 {'='*22}")
+                run_rollups(args.retention_days, DATABASE_NAME)
     
     print("\n🎉  任务执行完毕。")
@@ -1,55 +1,98 @@
+import argparse
+import html
+import os
+import time
 import requests
 from bs4 import BeautifulSoup
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import quote
 
+import http_client
+from rate_limiter import RateLimiter
+
+# 并发抓取设置
+MAX_WORKERS = 8  # 同时抓取页面的线程数
+REQUESTS_PER_SECOND = 4.0  # 所有线程共享的页面请求配额
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+VOLUME_LABEL = "今日成交"
+# 快速路径：'今日成交'文本之后紧跟的第一个span，span内只有纯文本
+# 不满足这种结构（中间隔着其他标签、span内有子标签等）时交给BeautifulSoup处理
+VOLUME_PATTERN = re.compile(r'[^<>]*<span\b[^>]*>([^<]*)</span>')
+
+# 随仓库提交的HTML样本，覆盖快速路径和BeautifulSoup回退两种页面结构
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'sales_pages')
+
 def encode_market_hash_name(market_hash_name):
     """将market_hash_name编码为URL格式"""
     # 替换特殊字符
     encoded = market_hash_name.replace(' ', '%20').replace('|', '%7C')
     return quote(encoded, safe='%')
 
-def get_item_sales_volume(market_hash_name):
+def get_item_url(market_hash_name):
+    """饰品在steamdt.com上的页面地址"""
+    return f'https://steamdt.com/cs2/{encode_market_hash_name(market_hash_name)}'
+
+def extract_sales_volume_fast(page_html):
+    """
+    直接在HTML文本中定位'今日成交'后的数值，不构建DOM树
+    返回 (是否命中快速路径, 成交量)，未命中时需要回退到完整解析
+    """
+    position = page_html.find(VOLUME_LABEL)
+    if position < 0:
+        return False, None
+
+    match = VOLUME_PATTERN.match(page_html, position + len(VOLUME_LABEL))
+    if not match:
+        return False, None
+    return True, html.unescape(match.group(1)).strip()
+
+def extract_sales_volume_soup(page_html):
+    """使用BeautifulSoup完整解析页面并提取成交量，找不到时返回None"""
+    soup = BeautifulSoup(page_html, 'html.parser')
+
+    # 定位并提取成交量数据
+    volume_label_element = soup.find(string=re.compile(VOLUME_LABEL))
+    if not volume_label_element:
+        print("未能在页面中定位到'今日成交'标签，可能是网站结构已更新。")
+        return None
+
+    volume_element = volume_label_element.find_next_sibling('span')
+    if not volume_element:
+        print("找到了'今日成交'标签，但未能找到其对应的数值元素。")
+        return None
+
+    return volume_element.get_text(strip=True)
+
+def extract_sales_volume(page_html):
+    """从页面中提取成交量：优先使用快速路径，结构不匹配时回退到BeautifulSoup"""
+    matched, volume = extract_sales_volume_fast(page_html)
+    if matched:
+        return volume
+    return extract_sales_volume_soup(page_html)
+
+def get_item_sales_volume(market_hash_name, limiter=None):
     """获取指定饰品的成交量"""
-    # 编码饰品名称
-    encoded_name = encode_market_hash_name(market_hash_name)
-    url = f'https://steamdt.com/cs2/{encoded_name}'
-    
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
-    
+    url = get_item_url(market_hash_name)
+
     try:
         print(f"正在请求页面: {url}")
-        response = requests.get(url, headers=headers, timeout=10)
+        # 只缓存包含成交量标签的完整页面，验证页、错误页等不写入缓存
+        response = http_client.get(url, 'page', headers=HEADERS, timeout=10, limiter=limiter,
+                                   cacheable=lambda page: VOLUME_LABEL in page.text)
         response.raise_for_status()
-        print("请求成功，正在解析页面...")
-
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # 定位并提取成交量数据
-        volume_label_element = soup.find(string=re.compile("今日成交"))
-        
-        volume = "未能找到成交量信息"  # 设置一个默认值
-
-        if volume_label_element:
-            print("已成功定位到'今日成交'标签。")
-            volume_element = volume_label_element.find_next_sibling('span')
-            
-            if volume_element:
-                volume = volume_element.get_text(strip=True)
-                print("已成功提取成交量数值。")
-            else:
-                print("找到了'今日成交'标签，但未能找到其对应的数值元素。")
-        else:
-            print("未能在页面中定位到'今日成交'标签，可能是网站结构已更新。")
-
-        print(f"\n--- 数据获取成功 ---")
-        print(f"饰品: {market_hash_name}")
-        print(f"今日成交量: {volume}")
-        
+
+        volume = extract_sales_volume(response.text)
+        if volume is None:
+            volume = "未能找到成交量信息"  # 设置一个默认值
+
+        print(f"饰品: {market_hash_name} 今日成交量: {volume}")
         return volume
-        
+
     except requests.exceptions.RequestException as e:
         print(f"\n请求网页时发生网络错误: {e}")
         return None
@@ -57,34 +100,120 @@ def get_item_sales_volume(market_hash_name):
         print(f"\n处理数据时发生未知错误: {e}")
         return None
 
-def get_multiple_items_sales_volume(market_hash_names):
+def iter_items_sales_volume(market_hash_names, max_workers=MAX_WORKERS, requests_per_second=REQUESTS_PER_SECOND):
+    """
+    并发抓取多个饰品的成交量，按完成顺序逐个产出 (饰品名称, 成交量)
+    页面由线程池并发抓取，所有线程共享同一个限速器；获取失败时成交量为None。
+    提前关闭生成器时不再抓取剩余页面。
+    """
+    limiter = RateLimiter(requests_per_second)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(get_item_sales_volume, item_name, limiter): item_name
+            for item_name in market_hash_names
+        }
+        try:
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            # 调用方提前停止迭代时，取消尚未开始抓取的页面
+            for future in futures:
+                future.cancel()
+
+def get_multiple_items_sales_volume(market_hash_names, max_workers=MAX_WORKERS, requests_per_second=REQUESTS_PER_SECOND):
     """批量获取多个饰品的成交量"""
-    results = {}
-    
-    for item_name in market_hash_names:
-        print(f"\n{'='*50}")
-        print(f"正在处理饰品: {item_name}")
-        print('='*50)
-        
-        volume = get_item_sales_volume(item_name)
+    volumes = {}
+    for item_name, volume in iter_items_sales_volume(market_hash_names, max_workers, requests_per_second):
         if volume:
-            results[item_name] = volume
-    
-    return results
+            volumes[item_name] = volume
+
+    # 结果按输入顺序返回
+    return {item_name: volumes[item_name] for item_name in market_hash_names if item_name in volumes}
+
+def save_fixtures(market_hash_names, fixture_dir):
+    """下载饰品页面保存为HTML样本，供 check_fixtures 离线校验解析逻辑"""
+    os.makedirs(fixture_dir, exist_ok=True)
+    for item_name in market_hash_names:
+        try:
+            response = http_client.request('GET', get_item_url(item_name), 'page', headers=HEADERS, timeout=10)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            print(f"❌ {item_name}: 下载失败 {e}")
+            continue
+        file_name = re.sub(r'[^\w\-]+', '_', item_name).strip('_') + '.html'
+        with open(os.path.join(fixture_dir, file_name), 'w', encoding='utf-8') as f:
+            f.write(response.text)
+        print(f"✅ {item_name} -> {file_name}")
+
+def check_fixtures(fixture_dir):
+    """
+    在保存的HTML样本上校验快速路径与BeautifulSoup路径的提取结果是否一致，并对比耗时
+    若存在同名的 .expected 文件，还会校验提取结果是否等于其中的期望值。
+    返回不一致的样本数量。
+    """
+    file_names = sorted(name for name in os.listdir(fixture_dir) if name.endswith('.html'))
+    if not file_names:
+        print(f"❌ '{fixture_dir}' 中没有HTML样本")
+        return 0
+
+    failures = 0
+    fast_total = soup_total = 0.0
+    for file_name in file_names:
+        with open(os.path.join(fixture_dir, file_name), 'r', encoding='utf-8') as f:
+            page_html = f.read()
+
+        start = time.perf_counter()
+        volume = extract_sales_volume(page_html)
+        fast_total += time.perf_counter() - start
+        path = "快速路径" if extract_sales_volume_fast(page_html)[0] else "回退"
+
+        start = time.perf_counter()
+        soup_volume = extract_sales_volume_soup(page_html)
+        soup_total += time.perf_counter() - start
+
+        expected_file = os.path.join(fixture_dir, file_name[:-len('.html')] + '.expected')
+        expected = soup_volume
+        if os.path.exists(expected_file):
+            with open(expected_file, 'r', encoding='utf-8') as f:
+                expected = f.read().strip()
+
+        ok = volume == soup_volume == expected
+        failures += not ok
+        print(f"{'✅' if ok else '❌'} {file_name} [{path}]: 提取={volume!r} BeautifulSoup={soup_volume!r} 期望={expected!r}")
+
+    print(f"\n共 {len(file_names)} 个样本，{failures} 个不一致")
+    print(f"提取耗时：快速路径 {fast_total * 1000:.1f} ms，BeautifulSoup {soup_total * 1000:.1f} ms")
+    return failures
 
 # 示例使用
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="饰品成交量抓取")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help="并发抓取线程数")
+    parser.add_argument('--rate', type=float, default=REQUESTS_PER_SECOND, help="所有线程共享的请求配额（请求/秒）")
+    parser.add_argument('--save-fixtures', metavar='DIR', help="下载示例饰品页面保存为HTML样本")
+    parser.add_argument('--check-fixtures', metavar='DIR', nargs='?', const=FIXTURE_DIR,
+                        help="在HTML样本上校验成交量解析，默认使用仓库中的 fixtures/sales_pages")
+    args = parser.parse_args()
+
     # 示例饰品列表
     test_items = [
         "AK-47 | Hydroponic (Factory New)",
         "M4A1-S | Printstream (Factory New)"
     ]
-    
-    print("开始批量获取饰品成交量...")
-    results = get_multiple_items_sales_volume(test_items)
-    
-    print(f"\n{'='*50}")
-    print("批量获取完成，结果汇总:")
-    print('='*50)
-    for item, volume in results.items():
-        print(f"{item}: {volume}")
\ No newline at end of file
+
+    if args.save_fixtures:
+        save_fixtures(test_items, args.save_fixtures)
+    elif args.check_fixtures:
+        raise SystemExit(1 if check_fixtures(args.check_fixtures) else 0)
+    else:
+        print("开始批量获取饰品成交量...")
+        start = time.perf_counter()
+        results = get_multiple_items_sales_volume(test_items, args.workers, args.rate)
+
+        print(f"\n{'='*50}")
+        print(f"批量获取完成，耗时 {time.perf_counter() - start:.1f} 秒，结果汇总:")
+        print('='*50)
+        for item, volume in results.items():
+            print(f"{item}: {volume}")
+        http_client.print_request_stats()
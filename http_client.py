@@ -0,0 +1,444 @@
+# -*- coding: utf-8 -*-
+import argparse
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import urlencode
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import storage
+
+# 本地响应缓存，开发调试和崩溃后重跑时直接读取，不消耗API的请求配额
+CACHE_DATABASE = "http_cache.db"
+# 大体积响应（download）直接写入该目录下的文件，数据库中只记录元数据
+CACHE_BODY_DIR = "http_cache"
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# 缓存数据库迁移版本（PRAGMA user_version）
+SCHEMA_BODY_FILES = 1  # responses 增加 body_file 列
+
+# 各类接口的缓存有效期（秒），0 表示不使用缓存
+CACHE_TTLS = {
+    'base': 24 * 3600,  # 物品基础信息，API每日仅允许调用一次
+    'kline': 12 * 3600,  # K线，请求参数中带有当日0点的时间戳
+    'chart': 12 * 3600,  # 大盘指数
+    'page': 3600,  # 饰品HTML页面（今日成交量）
+}
+
+# 连接池与重试设置
+POOL_SIZE = 16  # 每个线程的Session对每个主机保持的长连接数
+MAX_RETRIES = 3  # 网络错误、429和5xx时的最大重试次数
+BACKOFF_BASE = 1.0  # 首次重试前的基础等待秒数，之后按指数增长并加入随机抖动
+BACKOFF_MAX = 60.0  # 指数退避的等待上限
+RETRY_AFTER_MAX = 300.0  # 服务器 Retry-After 的等待上限
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_cache_created = False
+
+# 每个线程复用自己的Session，保持与各主机的长连接
+_local = threading.local()
+
+
+class EndpointStats:
+    """单个接口类型的请求计数和延迟统计"""
+
+    def __init__(self):
+        self.requests = 0  # 实际发出的请求数（包括重试）
+        self.retries = 0
+        self.failures = 0  # 重试耗尽后仍失败的调用数
+        self.cache_hits = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def record_latency(self, latency: float):
+        self.requests += 1
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+
+
+_stats = defaultdict(EndpointStats)
+_stats_lock = threading.Lock()
+
+
+class CachedResponse:
+    """
+    与 requests.Response 用法一致的响应对象，网络响应和缓存命中都以此形式返回
+    from_cache 表示内容来自本地缓存（包括经服务器304确认仍然有效的缓存）。
+    """
+
+    def __init__(self, url: str, status_code: int, headers: Dict[str, str], content: bytes, from_cache: bool = False):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.from_cache = from_cache
+
+    @property
+    def text(self) -> str:
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+
+def get_session() -> requests.Session:
+    """获取当前线程的Session，首次调用时创建并配置连接池"""
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = _local.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+    return session
+
+
+def backoff_delay(attempt: int) -> float:
+    """第 attempt 次重试（从0开始）前的等待秒数：指数增长，乘以0.5~1.5的随机抖动"""
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+def retry_after_seconds(response: requests.Response) -> float:
+    """解析 Retry-After 响应头（秒数或HTTP日期），没有或无法解析时返回0"""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return 0.0
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return 0.0
+    return min(RETRY_AFTER_MAX, max(0.0, seconds))
+
+
+def request(method: str, url: str, endpoint: str, limiter=None, max_retries: int = MAX_RETRIES,
+            **kwargs) -> requests.Response:
+    """
+    通过当前线程的长连接Session发出请求
+    网络错误、超时以及429/5xx响应按指数退避重试，服务器给出 Retry-After 时至少等待该时长；
+    每次实际发出请求前（包括重试）都从限速器获取令牌。
+    重试耗尽后返回最后一次响应，或抛出最后一次网络异常。
+    """
+    session = get_session()
+    for attempt in range(max_retries + 1):
+        if limiter:
+            limiter.acquire()
+        start = time.perf_counter()
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            _record(endpoint, time.perf_counter() - start, failed=attempt == max_retries)
+            if attempt == max_retries:
+                raise
+            delay = backoff_delay(attempt)
+            reason = type(e).__name__
+        else:
+            retryable = response.status_code in RETRY_STATUS_CODES
+            _record(endpoint, time.perf_counter() - start,
+                    failed=response.status_code >= 400 and (not retryable or attempt == max_retries))
+            if not retryable or attempt == max_retries:
+                return response
+            delay = max(backoff_delay(attempt), retry_after_seconds(response))
+            reason = f"HTTP {response.status_code}"
+            response.close()
+
+        with _stats_lock:
+            _stats[endpoint].retries += 1
+        print(f"🔁 {endpoint} 请求失败（{reason}），{delay:.1f} 秒后第 {attempt + 1} 次重试...")
+        time.sleep(delay)
+
+
+def post(url: str, endpoint: str, **kwargs) -> requests.Response:
+    """不经过缓存的POST请求"""
+    return request('POST', url, endpoint, **kwargs)
+
+
+def _record(endpoint: str, latency: float, failed: bool = False):
+    with _stats_lock:
+        stats = _stats[endpoint]
+        stats.record_latency(latency)
+        stats.failures += failed
+
+
+def request_counts(endpoint: str) -> Tuple[int, int]:
+    """返回某类接口累计实际发出的请求数（包括重试）和缓存命中数"""
+    with _stats_lock:
+        stats = _stats[endpoint]
+        return stats.requests, stats.cache_hits
+
+
+def print_request_stats():
+    """打印本次运行中各接口类型的请求数、重试、失败、缓存命中和延迟"""
+    with _stats_lock:
+        snapshot = sorted(_stats.items())
+    for endpoint, stats in snapshot:
+        average = stats.latency_total / stats.requests * 1000 if stats.requests else 0.0
+        print(f"🌐 {endpoint}: 请求 {stats.requests} 次，重试 {stats.retries} 次，失败 {stats.failures} 次，"
+              f"缓存命中 {stats.cache_hits} 次，平均延迟 {average:.0f} ms，最大 {stats.latency_max * 1000:.0f} ms")
+
+
+def api_success(response: CachedResponse) -> bool:
+    """steamdt 接口的响应是否为 success:true，失败的响应不写入缓存"""
+    try:
+        return bool(response.json().get('success'))
+    except ValueError:
+        return False
+
+
+def create_cache():
+    """创建响应缓存表"""
+    with storage.transaction(CACHE_DATABASE) as cursor:
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS responses (
+            cache_key TEXT PRIMARY KEY,
+            endpoint TEXT NOT NULL,
+            url TEXT NOT NULL,
+            status_code INTEGER NOT NULL,
+            headers TEXT NOT NULL,
+            body BLOB NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            fetched_at INTEGER NOT NULL
+        )
+        ''')
+        if storage.get_schema_version(cursor) < SCHEMA_BODY_FILES:
+            cursor.execute('PRAGMA table_info(responses)')
+            if 'body_file' not in [column[1] for column in cursor.fetchall()]:
+                cursor.execute('ALTER TABLE responses ADD COLUMN body_file TEXT')
+            storage.set_schema_version(cursor, SCHEMA_BODY_FILES)
+
+
+def _ensure_cache():
+    """每个进程只执行一次建表"""
+    global _cache_created
+    if not _cache_created:
+        create_cache()
+        _cache_created = True
+
+
+def make_cache_key(url: str, params: Optional[dict] = None) -> str:
+    """以URL和排序后的查询参数计算缓存键，参数顺序不影响命中"""
+    query = urlencode(sorted((params or {}).items()))
+    return hashlib.sha1(f"{url}?{query}".encode('utf-8')).hexdigest()
+
+
+def _load_entry(cache_key: str):
+    cursor = storage.get_connection(CACHE_DATABASE).cursor()
+    cursor.execute('''
+    SELECT url, status_code, headers, body, etag, last_modified, fetched_at
+    FROM responses WHERE cache_key = ?
+    ''', (cache_key,))
+    return cursor.fetchone()
+
+
+def _store_entry(cache_key: str, endpoint: str, response: CachedResponse):
+    with storage.transaction(CACHE_DATABASE) as cursor:
+        cursor.execute('''
+        INSERT OR REPLACE INTO responses
+        (cache_key, endpoint, url, status_code, headers, body, etag, last_modified, fetched_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            cache_key, endpoint, response.url, response.status_code,
+            json.dumps(response.headers, ensure_ascii=False), response.content,
+            response.headers.get('ETag'), response.headers.get('Last-Modified'), int(time.time()),
+        ))
+
+
+def _touch_entry(cache_key: str):
+    """服务器返回304时刷新缓存时间"""
+    with storage.transaction(CACHE_DATABASE) as cursor:
+        cursor.execute('UPDATE responses SET fetched_at = ? WHERE cache_key = ?', (int(time.time()), cache_key))
+
+
+def get(url: str, endpoint: str, params: Optional[dict] = None, headers: Optional[dict] = None,
+        timeout: float = 30, limiter=None,
+        cacheable: Callable[[CachedResponse], bool] = api_success) -> CachedResponse:
+    """
+    带本地缓存的GET请求，实际请求经由 request() 发出（长连接、退避重试）
+    缓存未过期时直接返回缓存内容，不发出请求也不占用限速器配额；
+    缓存已过期但带有ETag/Last-Modified时发出条件请求，服务器返回304则继续使用缓存。
+    只有状态码为200且 cacheable(response) 为真的响应才会写入缓存。
+    """
+    ttl = CACHE_TTLS.get(endpoint, 0)
+    cache_key = make_cache_key(url, params)
+    entry = None
+    if ttl > 0:
+        _ensure_cache()
+        entry = _load_entry(cache_key)
+
+    request_headers = dict(headers or {})
+    if entry:
+        cached_url, status_code, cached_headers, body, etag, last_modified, fetched_at = entry
+        cached = CachedResponse(cached_url, status_code, json.loads(cached_headers), body, from_cache=True)
+        if time.time() - fetched_at < ttl:
+            with _stats_lock:
+                _stats[endpoint].cache_hits += 1
+            return cached
+        if etag:
+            request_headers['If-None-Match'] = etag
+        if last_modified:
+            request_headers['If-Modified-Since'] = last_modified
+
+    raw = request('GET', url, endpoint, limiter=limiter, headers=request_headers, params=params, timeout=timeout)
+
+    if entry and raw.status_code == 304:
+        _touch_entry(cache_key)
+        with _stats_lock:
+            _stats[endpoint].cache_hits += 1
+        return cached
+
+    response = CachedResponse(raw.url, raw.status_code, dict(raw.headers), raw.content)
+    if ttl > 0 and response.status_code == 200 and cacheable(response):
+        _store_entry(cache_key, endpoint, response)
+    return response
+
+
+def download(url: str, endpoint: str, params: Optional[dict] = None, headers: Optional[dict] = None,
+             timeout: float = 60, limiter=None) -> Tuple[str, bool]:
+    """
+    分块下载大体积响应到本地文件，返回 (文件路径, 是否来自缓存)，内存占用与响应大小无关
+    缓存有效期和条件请求的处理与 get() 相同；响应体的内容由调用方流式解析，
+    发现内容不可用（如 success:false）时应调用 invalidate() 删除该缓存。
+    """
+    ttl = CACHE_TTLS.get(endpoint, 0)
+    cache_key = make_cache_key(url, params)
+    path = os.path.join(CACHE_BODY_DIR, cache_key + '.body')
+    _ensure_cache()
+    os.makedirs(CACHE_BODY_DIR, exist_ok=True)
+
+    cursor = storage.get_connection(CACHE_DATABASE).cursor()
+    cursor.execute('SELECT etag, last_modified, fetched_at FROM responses WHERE cache_key = ? AND body_file = ?',
+                   (cache_key, path))
+    entry = cursor.fetchone() if ttl > 0 and os.path.exists(path) else None
+
+    request_headers = dict(headers or {})
+    if entry:
+        etag, last_modified, fetched_at = entry
+        if time.time() - fetched_at < ttl:
+            with _stats_lock:
+                _stats[endpoint].cache_hits += 1
+            return path, True
+        if etag:
+            request_headers['If-None-Match'] = etag
+        if last_modified:
+            request_headers['If-Modified-Since'] = last_modified
+
+    with request('GET', url, endpoint, limiter=limiter, headers=request_headers, params=params,
+                 timeout=timeout, stream=True) as raw:
+        if entry and raw.status_code == 304:
+            _touch_entry(cache_key)
+            with _stats_lock:
+                _stats[endpoint].cache_hits += 1
+            return path, True
+        raw.raise_for_status()
+
+        # 先写入临时文件，下载完整后再替换，中断时不会留下半个响应
+        partial_path = path + '.part'
+        with open(partial_path, 'wb') as f:
+            for chunk in raw.iter_content(DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+        os.replace(partial_path, path)
+
+        if ttl > 0:
+            with storage.transaction(CACHE_DATABASE) as cursor:
+                cursor.execute('''
+                INSERT OR REPLACE INTO responses
+                (cache_key, endpoint, url, status_code, headers, body, etag, last_modified, fetched_at, body_file)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    cache_key, endpoint, raw.url, raw.status_code,
+                    json.dumps(dict(raw.headers), ensure_ascii=False), b'',
+                    raw.headers.get('ETag'), raw.headers.get('Last-Modified'), int(time.time()), path,
+                ))
+    return path, False
+
+
+def _remove_body_files(cursor, where: str, params: tuple = ()):
+    """删除即将被清除的缓存条目对应的响应文件"""
+    cursor.execute(f'SELECT body_file FROM responses WHERE body_file IS NOT NULL AND {where}', params)
+    for (body_file,) in cursor.fetchall():
+        if os.path.exists(body_file):
+            os.remove(body_file)
+
+
+def invalidate(url: str, params: Optional[dict] = None):
+    """删除指定请求的缓存"""
+    _ensure_cache()
+    cache_key = make_cache_key(url, params)
+    with storage.transaction(CACHE_DATABASE) as cursor:
+        _remove_body_files(cursor, 'cache_key = ?', (cache_key,))
+        cursor.execute('DELETE FROM responses WHERE cache_key = ?', (cache_key,))
+
+
+def purge_expired() -> int:
+    """删除已超过有效期且无法再验证的缓存条目，返回删除的数量"""
+    _ensure_cache()
+    now = int(time.time())
+    deleted = 0
+    with storage.transaction(CACHE_DATABASE) as cursor:
+        cursor.execute('SELECT DISTINCT endpoint FROM responses')
+        for (endpoint,) in cursor.fetchall():
+            where = 'endpoint = ? AND fetched_at < ? AND etag IS NULL AND last_modified IS NULL'
+            params = (endpoint, now - CACHE_TTLS.get(endpoint, 0))
+            _remove_body_files(cursor, where, params)
+            cursor.execute(f'DELETE FROM responses WHERE {where}', params)
+            deleted += cursor.rowcount
+    return deleted
+
+
+def clear_cache():
+    """清空所有缓存"""
+    _ensure_cache()
+    with storage.transaction(CACHE_DATABASE) as cursor:
+        _remove_body_files(cursor, '1')
+        cursor.execute('DELETE FROM responses')
+
+
+def print_stats():
+    """按接口类型统计缓存条目数量和大小"""
+    _ensure_cache()
+    cursor = storage.get_connection(CACHE_DATABASE).cursor()
+    cursor.execute('''
+    SELECT endpoint, COUNT(*), SUM(LENGTH(body)), MIN(fetched_at), GROUP_CONCAT(body_file, char(10))
+    FROM responses GROUP BY endpoint ORDER BY endpoint
+    ''')
+    rows = cursor.fetchall()
+    if not rows:
+        print("ℹ️  缓存为空")
+    for endpoint, count, size, oldest, body_files in rows:
+        for body_file in (body_files or '').splitlines():
+            if os.path.exists(body_file):
+                size += os.path.getsize(body_file)
+        age_hours = (time.time() - oldest) / 3600
+        print(f"{endpoint}: {count} 条, {size / 1024:.1f} KB, 最早的缓存距今 {age_hours:.1f} 小时 "
+              f"(有效期 {CACHE_TTLS.get(endpoint, 0) / 3600:g} 小时)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="管理本地HTTP响应缓存")
+    parser.add_argument('--clear', action='store_true', help="清空所有缓存")
+    parser.add_argument('--purge', action='store_true', help="删除已过期的缓存")
+    args = parser.parse_args()
+
+    try:
+        if args.clear:
+            clear_cache()
+            print("✅ 缓存已清空")
+        elif args.purge:
+            print(f"✅ 已删除 {purge_expired()} 条过期缓存")
+        print_stats()
+    except sqlite3.Error as e:
+        print(f"❌ 缓存数据库操作失败: {e}")
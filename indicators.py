@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+import argparse
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import storage
+from kline_store import KLINE_DTYPE, KlineStore
+
+DATABASE_NAME = "kline.db"
+
+# 指标参数
+SMA_WINDOW = 20  # 简单均线，同时作为布林带中轨
+BOLL_WIDTH = 2.0  # 布林带宽度（标准差倍数）
+EMA_FAST = 12
+EMA_SLOW = 26
+MACD_SIGNAL = 9
+RSI_PERIOD = 14
+ATR_PERIOD = 14
+VWAP_WINDOW = 20  # 成交量加权均价 = 窗口内成交额之和 / 成交量之和
+
+# 增量更新时，除新K线外还需读取的历史K线数量（滚动窗口所需的前序数据，且至少包含前一日收盘价）
+LOOKBACK = max(SMA_WINDOW, VWAP_WINDOW) - 1
+# 每次同时计算的物品数量，计算矩阵为 (物品数, 最长K线数)
+CHUNK_ITEMS = 1000
+
+INDICATOR_COLUMNS = ('sma', 'ema_fast', 'ema_slow', 'macd', 'macd_signal', 'macd_hist', 'rsi',
+                     'boll_upper', 'boll_lower', 'atr', 'vwap')
+# 递推类指标（EMA/MACD/RSI/ATR）在每个物品最后一根K线处的状态，增量更新时以此为初值继续递推
+STATE_COLUMNS = ('ema_fast', 'ema_slow', 'macd_signal', 'rsi_avg_gain', 'rsi_avg_loss', 'atr', 'bars')
+
+
+def create_tables():
+    """
+    创建指标表和状态表
+    kline_indicators 每根日K线一行，(market_hash_name, timestamp) 与 kline_data 一一对应；
+    kline_indicator_state 每个物品一行，记录已计算到的K线（时间戳和 kline_data.id）与递推状态；
+    kline_indicator_watermark 记录最近一次完整更新时 kline_data 的最大id。
+    """
+    with storage.transaction(DATABASE_NAME) as cursor:
+        cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS kline_indicators (
+            market_hash_name TEXT NOT NULL,
+            timestamp INTEGER NOT NULL,
+            {', '.join(f'{column} REAL' for column in INDICATOR_COLUMNS)},
+            PRIMARY KEY (market_hash_name, timestamp)
+        ) WITHOUT ROWID
+        ''')
+        cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS kline_indicator_state (
+            market_hash_name TEXT PRIMARY KEY,
+            last_ts INTEGER NOT NULL,
+            kline_id INTEGER NOT NULL,
+            {', '.join(f'{column} REAL' for column in STATE_COLUMNS)}
+        ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS kline_indicator_watermark (
+            name TEXT PRIMARY KEY,
+            watermark INTEGER NOT NULL
+        )
+        ''')
+
+
+def get_watermark(cursor) -> int:
+    """最近一次完整更新（未限定物品）时 kline_data 的最大id，之后写入的K线才需要检查"""
+    cursor.execute("SELECT watermark FROM kline_indicator_watermark WHERE name = 'kline_data'")
+    result = cursor.fetchone()
+    return result[0] if result else 0
+
+
+def load_update_plan(cursor, market_hash_names: Optional[List[str]] = None, full: bool = False):
+    """
+    确定需要更新的物品，写入临时表 indicator_plan (market_hash_name, last_ts, load_from, kline_id)
+    last_ts 为已计算到的最后一根K线（整体重算时为-1），load_from 为需要读取的第一根K线，
+    kline_id 为本次计算覆盖到的最大 kline_data.id。
+    只扫描水位线之后写入的K线：没有状态、指定 full、或新写入的K线不晚于 last_ts
+    （缺口补采插入了更早的K线）的物品整体重算，其余物品只计算新K线。
+    返回 {物品名称: 递推状态}，整体重算的物品不在其中。
+    """
+    cursor.execute('DROP TABLE IF EXISTS temp.indicator_plan')
+    cursor.execute('''
+    CREATE TEMP TABLE indicator_plan (
+        market_hash_name TEXT PRIMARY KEY,
+        last_ts INTEGER NOT NULL,
+        load_from INTEGER NOT NULL,
+        kline_id INTEGER NOT NULL
+    )
+    ''')
+
+    name_filter = ""
+    params = []
+    if market_hash_names is not None:
+        name_filter = f"AND k.market_hash_name IN ({','.join('?' * len(market_hash_names))})"
+        params = list(market_hash_names)
+
+    plan = []
+    states = {}
+    if full:
+        cursor.execute(f'''
+        SELECT k.market_hash_name, MAX(k.id) FROM kline_data AS k WHERE 1 {name_filter} GROUP BY k.market_hash_name
+        ''', params)
+        plan = [(market_hash_name, -1, 0, kline_id) for market_hash_name, kline_id in cursor.fetchall()]
+    else:
+        # first_new 为该物品尚未计算过的最早一根K线
+        cursor.execute(f'''
+        SELECT k.market_hash_name, MAX(k.id),
+               MIN(CASE WHEN s.kline_id IS NULL OR k.id > s.kline_id THEN k.timestamp END) AS first_new,
+               s.last_ts, {', '.join(f's.{column}' for column in STATE_COLUMNS)}
+        FROM kline_data AS k
+        LEFT JOIN kline_indicator_state AS s ON s.market_hash_name = k.market_hash_name
+        WHERE k.id > ? {name_filter}
+        GROUP BY k.market_hash_name
+        ''', [get_watermark(cursor)] + params)
+        for market_hash_name, kline_id, first_new, last_ts, *state in cursor.fetchall():
+            if first_new is None:
+                continue
+            if last_ts is None or first_new <= last_ts:
+                plan.append((market_hash_name, -1, 0, kline_id))
+            else:
+                plan.append((market_hash_name, last_ts, last_ts, kline_id))
+                states[market_hash_name] = state
+    cursor.executemany('INSERT INTO indicator_plan VALUES (?, ?, ?, ?)', plan)
+
+    # 增量更新的物品向前多读 LOOKBACK 根K线，不足时从第一根开始读
+    cursor.execute('''
+    UPDATE indicator_plan SET load_from = COALESCE((
+        SELECT timestamp FROM kline_data AS prior
+        WHERE prior.market_hash_name = indicator_plan.market_hash_name AND prior.timestamp <= indicator_plan.last_ts
+        ORDER BY prior.timestamp DESC LIMIT 1 OFFSET ?
+    ), 0)
+    WHERE last_ts >= 0
+    ''', (LOOKBACK - 1,))
+    return states
+
+
+def load_planned_klines(cursor) -> Tuple[KlineStore, np.ndarray, List[int]]:
+    """按 indicator_plan 读取K线，返回 (KlineStore, 每个物品的 last_ts, 每个物品的 kline_id)"""
+    cursor.execute('''
+    SELECT p.market_hash_name, p.last_ts, COUNT(*), p.kline_id
+    FROM indicator_plan AS p
+    JOIN kline_data AS k ON k.market_hash_name = p.market_hash_name AND k.timestamp >= p.load_from
+    GROUP BY p.market_hash_name ORDER BY p.market_hash_name
+    ''')
+    plan = cursor.fetchall()
+
+    cursor.execute('''
+    SELECT k.timestamp, k.open_price, k.close_price, k.high_price, k.low_price, k.volume, k.turnover
+    FROM indicator_plan AS p
+    JOIN kline_data AS k ON k.market_hash_name = p.market_hash_name AND k.timestamp >= p.load_from
+    ORDER BY p.market_hash_name, k.timestamp
+    ''')
+    data = np.fromiter(cursor, dtype=KLINE_DTYPE, count=sum(count for _, _, count, _ in plan))
+
+    offsets = np.zeros(len(plan) + 1, dtype=np.int64)
+    np.cumsum([count for _, _, count, _ in plan], out=offsets[1:])
+    store = KlineStore([name for name, _, _, _ in plan], offsets, data)
+    last_ts = np.array([last_ts for _, last_ts, _, _ in plan], dtype=np.int64)
+    return store, last_ts, [kline_id for _, _, _, kline_id in plan]
+
+
+def to_matrix(store: KlineStore, values: np.ndarray, fill=np.nan) -> np.ndarray:
+    """将按物品拼接的一维数组转为 (物品数, 最大K线数) 的矩阵，各物品右对齐，左侧以 fill 填充"""
+    lengths = np.diff(store.offsets)
+    width = int(lengths.max()) if len(lengths) else 0
+    rows = store.item_codes()
+    cols = (width - lengths)[rows] + np.arange(len(values)) - store.offsets[rows]
+    matrix = np.full((len(lengths), width), fill, dtype=values.dtype)
+    matrix[rows, cols] = values
+    return matrix
+
+
+def rolling_sum(matrix: np.ndarray, window: int) -> np.ndarray:
+    """按行计算长度为 window 的滚动和，窗口内含填充值（NaN）时结果为NaN"""
+    filled = np.nan_to_num(matrix)
+    sums = np.cumsum(np.pad(filled, ((0, 0), (1, 0))), axis=1)
+    counts = np.cumsum(np.pad(~np.isnan(matrix), ((0, 0), (1, 0))), axis=1)
+    result = np.full(matrix.shape, np.nan)
+    if matrix.shape[1] >= window:
+        full_window = counts[:, window:] - counts[:, :-window] == window
+        result[:, window - 1:] = np.where(full_window, sums[:, window:] - sums[:, :-window], np.nan)
+    return result
+
+
+def compute_indicators(store: KlineStore, last_ts: np.ndarray, seeds: Dict[str, tuple]) -> Dict[str, np.ndarray]:
+    """
+    在所有物品上同时计算指标，返回 {列名: 矩阵}，以及新K线的掩码 'new' 和最终递推状态 'state'
+    滚动类指标（SMA/布林带/VWAP）用累积和一次算出；递推类指标逐列推进，每一步对所有物品向量化计算：
+    EMA 以第一根收盘价为初值，RSI 与 ATR 使用 Wilder 平滑，RSI 在积累 RSI_PERIOD 个涨跌幅后才输出。
+    递推状态只在新K线上更新，用于补足滚动窗口的历史K线不会重复计入。
+    """
+    timestamps = to_matrix(store, store.data['timestamp'], fill=-1)
+    close = to_matrix(store, store.data['close'])
+    high = to_matrix(store, store.data['high'])
+    low = to_matrix(store, store.data['low'])
+    valid = timestamps >= 0
+    new = valid & (timestamps > last_ts[:, None])
+
+    result = {'new': new, 'timestamp': timestamps}
+
+    # 滚动窗口类
+    sma = rolling_sum(close, SMA_WINDOW) / SMA_WINDOW
+    mean_square = rolling_sum(close * close, SMA_WINDOW) / SMA_WINDOW
+    std = np.sqrt(np.maximum(mean_square - sma * sma, 0.0))
+    result['sma'] = sma
+    result['boll_upper'] = sma + BOLL_WIDTH * std
+    result['boll_lower'] = sma - BOLL_WIDTH * std
+    volume_sum = rolling_sum(to_matrix(store, store.data['volume']), VWAP_WINDOW)
+    turnover_sum = rolling_sum(to_matrix(store, store.data['turnover']), VWAP_WINDOW)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result['vwap'] = np.where(volume_sum > 0, turnover_sum / volume_sum, np.nan)
+
+    # 递推类：初始状态来自状态表，没有时为NaN（从第一根K线开始）
+    item_count, width = close.shape
+    state = np.full((len(STATE_COLUMNS), item_count), np.nan)
+    for i, name in enumerate(store.names):
+        if name in seeds:
+            state[:, i] = [np.nan if value is None else value for value in seeds[name]]
+    ema_fast, ema_slow, signal, avg_gain, avg_loss, atr, bars = state
+    bars = np.nan_to_num(bars)
+    prev_close = np.full(item_count, np.nan)
+
+    outputs = {name: np.full((item_count, width), np.nan)
+               for name in ('ema_fast', 'ema_slow', 'macd', 'macd_signal', 'macd_hist', 'rsi', 'atr')}
+    fast_alpha = 2.0 / (EMA_FAST + 1)
+    slow_alpha = 2.0 / (EMA_SLOW + 1)
+    signal_alpha = 2.0 / (MACD_SIGNAL + 1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for t in range(width):
+            price, step = close[:, t], new[:, t]
+            bars = np.where(step, bars + 1, bars)
+
+            ema_fast = np.where(step, np.where(np.isnan(ema_fast), price, ema_fast + fast_alpha * (price - ema_fast)), ema_fast)
+            ema_slow = np.where(step, np.where(np.isnan(ema_slow), price, ema_slow + slow_alpha * (price - ema_slow)), ema_slow)
+            macd = ema_fast - ema_slow
+            signal = np.where(step, np.where(np.isnan(signal), macd, signal + signal_alpha * (macd - signal)), signal)
+
+            change = price - prev_close
+            has_change = step & ~np.isnan(change)
+            gain, loss = np.maximum(change, 0.0), np.maximum(-change, 0.0)
+            avg_gain = np.where(has_change, np.where(np.isnan(avg_gain), gain, (avg_gain * (RSI_PERIOD - 1) + gain) / RSI_PERIOD), avg_gain)
+            avg_loss = np.where(has_change, np.where(np.isnan(avg_loss), loss, (avg_loss * (RSI_PERIOD - 1) + loss) / RSI_PERIOD), avg_loss)
+            rsi = np.where(avg_loss == 0, 100.0, 100.0 - 100.0 / (1.0 + avg_gain / avg_loss))
+
+            true_range = np.fmax(high[:, t] - low[:, t],
+                                 np.fmax(np.abs(high[:, t] - prev_close), np.abs(low[:, t] - prev_close)))
+            atr = np.where(step, np.where(np.isnan(atr), true_range, (atr * (ATR_PERIOD - 1) + true_range) / ATR_PERIOD), atr)
+            prev_close = np.where(valid[:, t], price, prev_close)
+
+            outputs['ema_fast'][:, t] = ema_fast
+            outputs['ema_slow'][:, t] = ema_slow
+            outputs['macd'][:, t] = macd
+            outputs['macd_signal'][:, t] = signal
+            outputs['macd_hist'][:, t] = macd - signal
+            outputs['rsi'][:, t] = np.where(bars > RSI_PERIOD, rsi, np.nan)
+            outputs['atr'][:, t] = atr
+
+    result.update(outputs)
+    # 各物品最后一根K线处的递推状态（矩阵右对齐，最后一列即为最后一根K线）
+    result['state'] = np.vstack([ema_fast, ema_slow, signal, avg_gain, avg_loss, atr, bars])
+    return result
+
+
+def iter_indicator_rows(store: KlineStore, result: Dict[str, np.ndarray]):
+    """产出新K线对应的指标行（SQLite 将 NaN 存为NULL）"""
+    rows, cols = np.nonzero(result['new'])
+    names = np.array(store.names, dtype=object)[rows]
+    columns = [result['timestamp'][rows, cols].tolist()]
+    for name in INDICATOR_COLUMNS:
+        columns.append(result[name][rows, cols].tolist())
+    return zip(names.tolist(), *columns)
+
+
+def iter_state_rows(store: KlineStore, kline_ids: List[int], result: Dict[str, np.ndarray]):
+    """产出每个物品的 (market_hash_name, last_ts, kline_id, 递推状态...)"""
+    last_ts = result['timestamp'][:, -1].tolist()
+    state = result['state']
+    columns = [column.tolist() for column in state[:-1]] + [state[-1].astype(np.int64).tolist()]
+    return zip(store.names, last_ts, kline_ids, *columns)
+
+
+def iter_chunks(store: KlineStore, chunk_items: int):
+    """按物品分块，限制计算矩阵的内存占用，产出 (起始序号, 结束序号, 分块)"""
+    for start in range(0, len(store), chunk_items):
+        end = min(start + chunk_items, len(store))
+        offsets = store.offsets[start:end + 1]
+        yield start, end, KlineStore(store.names[start:end], offsets - offsets[0], store.data[offsets[0]:offsets[-1]])
+
+
+def update_indicators(market_hash_names: Optional[List[str]] = None, full: bool = False) -> int:
+    """
+    增量更新 kline_indicators，返回写入的行数
+    只处理有新K线的物品，并且只计算新K线（连同滚动窗口所需的历史K线），递推类指标从上次保存的状态继续。
+    """
+    try:
+        create_tables()
+        started = time.perf_counter()
+        with storage.transaction(DATABASE_NAME) as cursor:
+            cursor.execute('BEGIN')
+            seeds = load_update_plan(cursor, market_hash_names, full)
+            store, last_ts, kline_ids = load_planned_klines(cursor)
+
+            # 整体重算的物品先清除旧指标
+            cursor.execute('''
+            DELETE FROM kline_indicators WHERE market_hash_name IN (
+                SELECT market_hash_name FROM indicator_plan WHERE last_ts = -1
+            )
+            ''')
+            written = 0
+            for start, end, chunk in iter_chunks(store, CHUNK_ITEMS):
+                result = compute_indicators(chunk, last_ts[start:end], seeds)
+                cursor.executemany(f'''
+                INSERT OR REPLACE INTO kline_indicators (market_hash_name, timestamp, {', '.join(INDICATOR_COLUMNS)})
+                VALUES ({', '.join('?' * (len(INDICATOR_COLUMNS) + 2))})
+                ''', iter_indicator_rows(chunk, result))
+                written += cursor.rowcount
+                cursor.executemany(f'''
+                INSERT OR REPLACE INTO kline_indicator_state
+                (market_hash_name, last_ts, kline_id, {', '.join(STATE_COLUMNS)})
+                VALUES ({', '.join('?' * (len(STATE_COLUMNS) + 3))})
+                ''', iter_state_rows(chunk, kline_ids[start:end], result))
+            cursor.execute('DROP TABLE temp.indicator_plan')
+
+            # 只有未限定物品的更新才推进水位线
+            if market_hash_names is None:
+                cursor.execute('''
+                INSERT INTO kline_indicator_watermark (name, watermark)
+                SELECT 'kline_data', COALESCE(MAX(id), 0) FROM kline_data WHERE 1
+                ON CONFLICT(name) DO UPDATE SET watermark = excluded.watermark
+                ''')
+
+        if len(store) == 0:
+            print("✅ 技术指标已是最新")
+            return 0
+
+        print(f"✅ 已更新 {len(store)} 个物品的技术指标，写入 {written} 行，耗时 {time.perf_counter() - started:.2f} 秒"
+              f"（其中 {len(store) - len(seeds)} 个物品整体重算）")
+        return written
+
+    except sqlite3.Error as e:
+        print(f"❌ 更新技术指标失败: {e}")
+        return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="计算并增量更新K线技术指标")
+    parser.add_argument('--item', action='append', dest='items', metavar='MARKET_HASH_NAME', help="只更新指定物品，可重复")
+    parser.add_argument('--full', action='store_true', help="忽略已有结果，整体重算")
+    args = parser.parse_args()
+    update_indicators(args.items, args.full)
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import storage
+
+# 物品目录数据库：marketHashName -> 各平台itemId 的索引，每日刷新时写入一次
+CATALOG_DATABASE = "item_catalog.db"
+# get_all_items.py 旧版写入的完整JSON缓存，仅用于首次迁移
+ALL_ITEMS_CACHE_FILE = "all_items_cache.json"
+# 刷新目录时每批写入暂存表的物品数量
+STAGING_BATCH_SIZE = 1000
+# 变更类型在差异文件中的标记
+CHANGE_SIGNS = {'added': '+', 'updated': '~', 'removed': '-'}
+
+
+def create_catalog():
+    """创建物品目录表、内容哈希表、变更日志表，以及刷新目录时使用的暂存表"""
+    with storage.transaction(CATALOG_DATABASE) as cursor:
+        # (market_hash_name, platform) 作为主键，WITHOUT ROWID 让查询直接命中主键B树
+        for table in ('platform_items', 'staging_platform_items'):
+            cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                market_hash_name TEXT NOT NULL,
+                platform TEXT NOT NULL,
+                item_id TEXT NOT NULL,
+                PRIMARY KEY (market_hash_name, platform)
+            ) WITHOUT ROWID
+            ''')
+        # 每个物品完整信息的内容哈希，用于判断物品是否发生变化
+        for table in ('catalog_items', 'staging_catalog_items'):
+            cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                market_hash_name TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                updated_at INTEGER NOT NULL
+            ) WITHOUT ROWID
+            ''')
+        # 每次刷新新增、更新、移除的物品，change_id 单调递增，供下游按"上次处理到的位置"增量读取
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS catalog_changes (
+            change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            market_hash_name TEXT NOT NULL,
+            change_type TEXT NOT NULL,
+            changed_at INTEGER NOT NULL
+        )
+        ''')
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_catalog_changes_name ON catalog_changes(market_hash_name, change_id)
+        ''')
+
+
+def iter_platform_rows(all_items: Iterable[dict]):
+    """将API返回的物品信息展开为 (market_hash_name, platform, item_id) 行"""
+    for item in all_items:
+        market_hash_name = item.get('marketHashName')
+        if not market_hash_name:
+            continue
+        for platform in item.get('platformList') or []:
+            platform_name = platform.get('name')
+            item_id = platform.get('itemId')
+            if platform_name and item_id:
+                yield market_hash_name, platform_name, str(item_id)
+
+
+def item_content_hash(item: dict) -> str:
+    """物品信息的内容哈希：按键排序序列化后计算，字段顺序不影响结果"""
+    return hashlib.sha1(json.dumps(item, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def _stage_items(cursor, all_items: Iterable[dict], now: int) -> int:
+    """把物品流分批写入暂存表，返回暂存的平台ID行数"""
+    cursor.execute('DELETE FROM staging_catalog_items')
+    cursor.execute('DELETE FROM staging_platform_items')
+
+    def flush():
+        cursor.executemany('''
+        INSERT OR REPLACE INTO staging_catalog_items (market_hash_name, content_hash, updated_at) VALUES (?, ?, ?)
+        ''', item_rows)
+        cursor.executemany('''
+        INSERT OR REPLACE INTO staging_platform_items (market_hash_name, platform, item_id) VALUES (?, ?, ?)
+        ''', platform_rows)
+        item_rows.clear()
+        platform_rows.clear()
+
+    item_rows, platform_rows = [], []
+    staged = 0
+    for item in all_items:
+        market_hash_name = item.get('marketHashName')
+        if not market_hash_name:
+            continue
+        item_rows.append((market_hash_name, item_content_hash(item), now))
+        rows = list(iter_platform_rows((item,)))
+        platform_rows.extend(rows)
+        staged += len(rows)
+        if len(item_rows) >= STAGING_BATCH_SIZE:
+            flush()
+    flush()
+    return staged
+
+
+def build_catalog(all_items: Iterable[dict], diff_path: Optional[str] = None) -> Tuple[int, int, int, int]:
+    """
+    用最新的物品列表增量刷新目录，返回 (平台ID行数, 新增物品数, 更新物品数, 移除物品数)
+    all_items 可以是流式解析的生成器：物品分批写入暂存表，再在SQL中按内容哈希与现有目录比对，
+    只对新增、更新、移除的物品改动目录，并把变更追加到 catalog_changes。
+    整个过程在一个事务中完成，生成器抛出异常时回滚，原目录保持不变。
+    指定 diff_path 时，将本次变更写入该文件（"+" 新增、"~" 更新、"-" 移除）。
+    """
+    create_catalog()
+    now = int(time.time())
+    with storage.transaction(CATALOG_DATABASE) as cursor:
+        staged = _stage_items(cursor, all_items, now)
+
+        # 旧版目录没有内容哈希，第一次刷新时整体重建
+        cursor.execute('SELECT 1 FROM catalog_items LIMIT 1')
+        if cursor.fetchone() is None:
+            cursor.execute('DELETE FROM platform_items')
+
+        cursor.execute('SELECT COALESCE(MAX(change_id), 0) FROM catalog_changes')
+        last_change_id = cursor.fetchone()[0]
+        cursor.execute('''
+        INSERT INTO catalog_changes (market_hash_name, change_type, changed_at)
+        SELECT s.market_hash_name, CASE WHEN c.market_hash_name IS NULL THEN 'added' ELSE 'updated' END, ?
+        FROM staging_catalog_items AS s
+        LEFT JOIN catalog_items AS c ON c.market_hash_name = s.market_hash_name
+        WHERE c.content_hash IS NOT s.content_hash
+        UNION ALL
+        SELECT c.market_hash_name, 'removed', ?
+        FROM catalog_items AS c
+        WHERE NOT EXISTS (SELECT 1 FROM staging_catalog_items AS s WHERE s.market_hash_name = c.market_hash_name)
+        ''', (now, now))
+
+        changed = '''
+        SELECT market_hash_name FROM catalog_changes WHERE change_id > ? AND change_type IN ({})
+        '''
+        cursor.execute(f'''
+        DELETE FROM platform_items WHERE market_hash_name IN ({changed.format("'updated', 'removed'")})
+        ''', (last_change_id,))
+        cursor.execute(f'''
+        DELETE FROM catalog_items WHERE market_hash_name IN ({changed.format("'removed'")})
+        ''', (last_change_id,))
+        cursor.execute(f'''
+        INSERT OR REPLACE INTO platform_items (market_hash_name, platform, item_id)
+        SELECT market_hash_name, platform, item_id FROM staging_platform_items
+        WHERE market_hash_name IN ({changed.format("'added', 'updated'")})
+        ''', (last_change_id,))
+        cursor.execute(f'''
+        INSERT OR REPLACE INTO catalog_items (market_hash_name, content_hash, updated_at)
+        SELECT market_hash_name, content_hash, updated_at FROM staging_catalog_items
+        WHERE market_hash_name IN ({changed.format("'added', 'updated'")})
+        ''', (last_change_id,))
+
+        counts = {'added': 0, 'updated': 0, 'removed': 0}
+        cursor.execute('''
+        SELECT change_type, market_hash_name FROM catalog_changes WHERE change_id > ? ORDER BY change_id
+        ''', (last_change_id,))
+        diff_file = open(diff_path, 'w', encoding='utf-8') if diff_path else None
+        try:
+            for change_type, market_hash_name in cursor:
+                counts[change_type] += 1
+                if diff_file:
+                    diff_file.write(f"{CHANGE_SIGNS[change_type]} {market_hash_name}\n")
+        finally:
+            if diff_file:
+                diff_file.close()
+
+        cursor.execute('DELETE FROM staging_catalog_items')
+        cursor.execute('DELETE FROM staging_platform_items')
+        return staged, counts['added'], counts['updated'], counts['removed']
+
+
+def is_catalog_empty() -> bool:
+    """检查目录是否为空"""
+    cursor = storage.get_connection(CATALOG_DATABASE).cursor()
+    cursor.execute('SELECT 1 FROM platform_items LIMIT 1')
+    return cursor.fetchone() is None
+
+
+def import_json_cache() -> int:
+    """从旧版 all_items_cache.json 导入目录（仅在目录为空时需要）"""
+    if not os.path.exists(ALL_ITEMS_CACHE_FILE):
+        return 0
+    with open(ALL_ITEMS_CACHE_FILE, 'r', encoding='utf-8') as f:
+        all_items = json.load(f)
+    count = build_catalog(all_items)[0]
+    print(f"✅ 已从 '{ALL_ITEMS_CACHE_FILE}' 导入 {count} 条平台ID到物品目录")
+    return count
+
+
+def ensure_catalog() -> bool:
+    """确保目录可用：目录为空时尝试从旧版JSON缓存迁移"""
+    try:
+        create_catalog()
+        if is_catalog_empty():
+            import_json_cache()
+        return not is_catalog_empty()
+    except (sqlite3.Error, json.JSONDecodeError) as e:
+        print(f"❌ 加载物品目录失败: {e}")
+        return False
+
+
+def get_platform_item_id(market_hash_name: str, platform: str) -> Optional[str]:
+    """查询单个物品在指定平台的itemId"""
+    cursor = storage.get_connection(CATALOG_DATABASE).cursor()
+    cursor.execute('''
+    SELECT item_id FROM platform_items WHERE market_hash_name = ? AND platform = ?
+    ''', (market_hash_name, platform))
+    result = cursor.fetchone()
+    return result[0] if result else None
+
+
+def get_platform_item_ids(market_hash_names: List[str], platform: str) -> Dict[str, str]:
+    """批量查询多个物品在指定平台的itemId，找不到的物品不会出现在结果中"""
+    mapping = {}
+    for market_hash_name in market_hash_names:
+        item_id = get_platform_item_id(market_hash_name, platform)
+        if item_id:
+            mapping[market_hash_name] = item_id
+    return mapping
+
+
+def latest_change_id() -> int:
+    """目录变更日志中最新的 change_id，下游可保存该值作为下一次 changed_since 的起点"""
+    cursor = storage.get_connection(CATALOG_DATABASE).cursor()
+    cursor.execute('SELECT COALESCE(MAX(change_id), 0) FROM catalog_changes')
+    return cursor.fetchone()[0]
+
+
+def changed_since(since_change_id: int = 0, platform: Optional[str] = None) -> List[Tuple[int, str, str, Optional[str]]]:
+    """
+    查询 since_change_id 之后发生变化的物品，返回 [(change_id, market_hash_name, change_type, item_id)]
+    同一物品多次变化时只返回最后一次；指定 platform 时 item_id 为该物品当前在该平台的itemId，
+    已移除或该平台没有的物品为None。
+    """
+    cursor = storage.get_connection(CATALOG_DATABASE).cursor()
+    cursor.execute('''
+    SELECT c.change_id, c.market_hash_name, c.change_type, p.item_id
+    FROM catalog_changes AS c
+    LEFT JOIN platform_items AS p ON p.market_hash_name = c.market_hash_name AND p.platform = ?
+    WHERE c.change_id = (
+        SELECT MAX(change_id) FROM catalog_changes AS latest
+        WHERE latest.market_hash_name = c.market_hash_name
+    ) AND c.change_id > ?
+    ORDER BY c.change_id
+    ''', (platform, since_change_id))
+    return cursor.fetchall()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="查询物品目录的变更")
+    parser.add_argument('--changed-since', type=int, default=0, metavar='CHANGE_ID', help="只显示该 change_id 之后的变更")
+    parser.add_argument('--platform', help="同时显示物品在该平台的itemId，例如 C5")
+    args = parser.parse_args()
+
+    try:
+        create_catalog()
+        changes = changed_since(args.changed_since, args.platform)
+        for change_id, market_hash_name, change_type, item_id in changes:
+            suffix = f" ({args.platform}: {item_id})" if args.platform else ""
+            print(f"{change_id:>8} {CHANGE_SIGNS[change_type]} {market_hash_name}{suffix}")
+        print(f"\n共 {len(changes)} 个物品发生变化，最新 change_id: {latest_change_id()}")
+    except sqlite3.Error as e:
+        print(f"❌ 查询物品目录失败: {e}")
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import storage
+
+DATABASE_NAME = "kline.db"
+
+# 每根日K线在内存中的布局，与 kline_data 表的数值列一一对应
+KLINE_DTYPE = np.dtype([
+    ('timestamp', np.int64),
+    ('open', np.float64),
+    ('close', np.float64),
+    ('high', np.float64),
+    ('low', np.float64),
+    ('volume', np.float64),
+    ('turnover', np.float64),
+])
+# 结构化数组字段对应的 kline_data 列名
+KLINE_COLUMNS = {
+    'timestamp': 'timestamp',
+    'open': 'open_price',
+    'close': 'close_price',
+    'high': 'high_price',
+    'low': 'low_price',
+    'volume': 'volume',
+    'turnover': 'turnover',
+}
+
+
+class KlineStore:
+    """
+    列式K线存储：所有物品的K线按 (物品, 时间) 顺序存放在一个连续的结构化数组中，
+    第 i 个物品的数据位于 data[offsets[i]:offsets[i + 1]]。
+    按物品或时间切片得到的都是原数组的视图，不会复制数据。
+    """
+
+    def __init__(self, names: List[str], offsets: np.ndarray, data: np.ndarray):
+        self.names = names
+        self.offsets = offsets
+        self.data = data
+        self._index = {name: i for i, name in enumerate(names)}
+
+    @classmethod
+    def load(cls, market_hash_names: Optional[List[str]] = None,
+             start: Optional[int] = None, end: Optional[int] = None,
+             database_name: str = DATABASE_NAME, fields: Optional[Tuple[str, ...]] = None) -> 'KlineStore':
+        """
+        从 kline_data 读取K线，可按物品和时间范围 [start, end] 过滤
+        两次查询（每个物品的行数、按顺序排列的数值列）在同一个读事务中完成，结果保持一致。
+        fields 指定只读取 KLINE_DTYPE 中的部分字段（必须包含 timestamp），读取的列越少越快。
+        """
+        fields = KLINE_DTYPE.names if fields is None else fields
+        if 'timestamp' not in fields:
+            raise ValueError("fields 必须包含 timestamp")
+        dtype = np.dtype([(field, KLINE_DTYPE[field]) for field in fields])
+        conditions = []
+        params = []
+        if market_hash_names is not None:
+            conditions.append(f"market_hash_name IN ({','.join('?' * len(market_hash_names))})")
+            params.extend(market_hash_names)
+        if start is not None:
+            conditions.append("timestamp >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("timestamp <= ?")
+            params.append(end)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        with storage.transaction(database_name) as cursor:
+            cursor.execute('BEGIN')
+            cursor.execute(f'''
+            SELECT market_hash_name, COUNT(*) FROM kline_data {where}
+            GROUP BY market_hash_name ORDER BY market_hash_name
+            ''', params)
+            counts = cursor.fetchall()
+
+            total = sum(count for _, count in counts)
+            cursor.execute(f'''
+            SELECT {', '.join(KLINE_COLUMNS[field] for field in fields)}
+            FROM kline_data {where}
+            ORDER BY market_hash_name, timestamp
+            ''', params)
+            data = np.fromiter(cursor, dtype=dtype, count=total)
+
+        names = [name for name, _ in counts]
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum([count for _, count in counts], out=offsets[1:])
+        return cls(names, offsets, data)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, market_hash_name: str) -> bool:
+        return market_hash_name in self._index
+
+    def item(self, market_hash_name: str) -> np.ndarray:
+        """指定物品的全部K线（视图）"""
+        i = self._index[market_hash_name]
+        return self.data[self.offsets[i]:self.offsets[i + 1]]
+
+    def range(self, market_hash_name: str, start: Optional[int] = None, end: Optional[int] = None) -> np.ndarray:
+        """指定物品在时间范围 [start, end] 内的K线（视图），通过二分查找定位"""
+        candles = self.item(market_hash_name)
+        timestamps = candles['timestamp']
+        lo = 0 if start is None else np.searchsorted(timestamps, start, side='left')
+        hi = len(candles) if end is None else np.searchsorted(timestamps, end, side='right')
+        return candles[lo:hi]
+
+    def items(self) -> Iterator[Tuple[str, np.ndarray]]:
+        """依次产出 (物品名称, K线视图)"""
+        for i, name in enumerate(self.names):
+            yield name, self.data[self.offsets[i]:self.offsets[i + 1]]
+
+    def item_codes(self) -> np.ndarray:
+        """与 data 等长的物品序号数组，便于按物品分组做向量化计算"""
+        return np.repeat(np.arange(len(self.names)), np.diff(self.offsets))
+
+    def column(self, field: str) -> np.ndarray:
+        """所有物品的某一列，返回结构化数组的字段视图（按行跨步，非连续），需要连续内存时请自行 np.ascontiguousarray"""
+        return self.data[field]
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+import argparse
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import get_market_index
+import storage
+from kline_store import KlineStore
+from time_utils import DAY_SECONDS
+
+DATABASE_NAME = "kline.db"
+
+# 滚动窗口长度（大盘指数交易日数）与计算所需的最少有效日收益率数
+BETA_WINDOW = 60
+MIN_OBSERVATIONS = 30
+# 每次同时计算的物品数量，计算矩阵为 (物品数, 窗口加新增天数)
+CHUNK_ITEMS = 2000
+
+BETA_COLUMNS = ('beta', 'correlation', 'residual_vol', 'observations')
+
+
+def create_tables():
+    """
+    创建Beta结果表和水位线表
+    kline_beta 每个物品每个窗口结束日一行，有效观测不足 MIN_OBSERVATIONS 或指数无波动的日期不写入；
+    物品价格无波动时 correlation 为NULL；
+    kline_beta_watermark 记录上次计算覆盖到的 kline_data.id 与 market_index.id。
+    """
+    with storage.transaction(DATABASE_NAME) as cursor:
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS kline_beta (
+            market_hash_name TEXT NOT NULL,
+            timestamp INTEGER NOT NULL,
+            beta REAL,
+            correlation REAL,
+            residual_vol REAL,
+            observations INTEGER NOT NULL,
+            PRIMARY KEY (market_hash_name, timestamp)
+        ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS kline_beta_watermark (
+            name TEXT PRIMARY KEY,
+            watermark INTEGER NOT NULL
+        )
+        ''')
+
+
+def get_watermark(cursor, name: str) -> int:
+    """读取某个源表已处理到的最大id"""
+    cursor.execute('SELECT watermark FROM kline_beta_watermark WHERE name = ?', (name,))
+    result = cursor.fetchone()
+    return result[0] if result else 0
+
+
+def load_index() -> Tuple[np.ndarray, np.ndarray, int]:
+    """读取大盘指数，返回 (按时间排序的时间戳, 指数值, 最大id)"""
+    cursor = storage.get_connection(get_market_index.DATABASE_NAME).cursor()
+    cursor.execute('SELECT timestamp, index_value FROM market_index ORDER BY timestamp')
+    rows = cursor.fetchall()
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM market_index')
+    max_id = cursor.fetchone()[0]
+    timestamps = np.array([timestamp for timestamp, _ in rows], dtype=np.int64)
+    values = np.array([value for _, value in rows], dtype=np.float64)
+    return timestamps, values, max_id
+
+
+def index_changed_since(watermark: int) -> Optional[int]:
+    """水位线之后新增的指数中最早的时间戳，没有新增时返回None"""
+    cursor = storage.get_connection(get_market_index.DATABASE_NAME).cursor()
+    cursor.execute('SELECT MIN(timestamp) FROM market_index WHERE id > ?', (watermark,))
+    return cursor.fetchone()[0]
+
+
+def plan_updates(cursor, kline_watermark: int, index_since: Optional[int]) -> Dict[str, int]:
+    """
+    返回 {物品名称: 需要重算的第一个窗口结束日}
+    水位线之后有新K线的物品从最早的新K线开始重算；指数有新增时所有物品至少从最早的新指数日开始重算。
+    """
+    cursor.execute('''
+    SELECT market_hash_name, MIN(timestamp) FROM kline_data WHERE id > ? GROUP BY market_hash_name
+    ''', (kline_watermark,))
+    since = dict(cursor.fetchall())
+    if index_since is not None:
+        cursor.execute('SELECT DISTINCT market_hash_name FROM kline_data')
+        for (market_hash_name,) in cursor.fetchall():
+            since[market_hash_name] = min(since.get(market_hash_name, index_since), index_since)
+    return since
+
+
+def daily_returns(prices: np.ndarray, grid: np.ndarray) -> np.ndarray:
+    """
+    沿最后一维计算日收益率，结果与 prices 同形，第一列为NaN
+    只有与前一个网格日恰好相差一天的位置才计算收益率，缺失价格得到NaN。
+    """
+    returns = np.full(prices.shape, np.nan)
+    consecutive = np.diff(grid) == DAY_SECONDS
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns[..., 1:] = np.where(consecutive, prices[..., 1:] / prices[..., :-1] - 1.0, np.nan)
+    return returns
+
+
+def window_sums(matrix: np.ndarray, window: int) -> np.ndarray:
+    """按行计算长度为 window 的滚动和（累积和相减），前 window - 1 列为截至该列的部分和"""
+    sums = np.cumsum(matrix, axis=1)
+    sums[:, window:] -= sums[:, :-window].copy()
+    return sums
+
+
+def compute_betas(item_returns: np.ndarray, index_returns: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    对所有物品同时计算滚动 Beta、相关系数与残差波动率，返回 {列名: 矩阵}
+    每个窗口只使用物品与指数都有收益率的日期，六个滚动和由累积和一次算出：
+    beta = cov / var(指数)，residual_vol 为 物品收益率 - beta * 指数收益率 的标准差（日度）。
+    """
+    valid = ~np.isnan(item_returns) & ~np.isnan(index_returns)[None, :]
+    x = np.where(valid, index_returns[None, :], 0.0)
+    y = np.where(valid, item_returns, 0.0)
+
+    n = window_sums(valid.astype(np.float64), BETA_WINDOW)
+    sum_x = window_sums(x, BETA_WINDOW)
+    sum_y = window_sums(y, BETA_WINDOW)
+    sum_xy = window_sums(x * y, BETA_WINDOW)
+    sum_xx = window_sums(x * x, BETA_WINDOW)
+    sum_yy = window_sums(y * y, BETA_WINDOW)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_x, mean_y = sum_x / n, sum_y / n
+        cov = sum_xy / n - mean_x * mean_y
+        var_x = np.maximum(sum_xx / n - mean_x * mean_x, 0.0)
+        var_y = np.maximum(sum_yy / n - mean_y * mean_y, 0.0)
+        beta = np.where(var_x > 0, cov / var_x, np.nan)
+        correlation = np.where((var_x > 0) & (var_y > 0), cov / np.sqrt(var_x * var_y), np.nan)
+        residual_vol = np.sqrt(np.maximum(var_y - beta * cov, 0.0))
+
+    return {
+        'beta': beta,
+        'correlation': np.clip(correlation, -1.0, 1.0),
+        'residual_vol': residual_vol,
+        'observations': n.astype(np.int64),
+        # 只有观测足够且指数有波动的窗口才写入结果表
+        'enough': (n >= MIN_OBSERVATIONS) & (var_x > 0),
+    }
+
+
+def align_closes(store: KlineStore, grid: np.ndarray) -> np.ndarray:
+    """把各物品的收盘价放到指数日期网格上，得到 (物品数, 网格长度) 的矩阵，不在网格上的K线被忽略"""
+    closes = np.full((len(store), len(grid)), np.nan)
+    timestamps = store.data['timestamp']
+    positions = np.minimum(np.searchsorted(grid, timestamps), len(grid) - 1)
+    on_grid = grid[positions] == timestamps
+    closes[store.item_codes()[on_grid], positions[on_grid]] = store.data['close'][on_grid]
+    return closes
+
+
+def iter_beta_rows(store: KlineStore, grid: np.ndarray, first_column: np.ndarray, result: Dict[str, np.ndarray]):
+    """产出每个物品从 first_column 起有效窗口的 (market_hash_name, timestamp, beta, correlation, residual_vol, observations)"""
+    rows, cols = np.nonzero(result['enough'] & (np.arange(len(grid))[None, :] >= first_column[:, None]))
+    names = np.array(store.names, dtype=object)[rows]
+    columns = [result[name][rows, cols].tolist() for name in BETA_COLUMNS]
+    return zip(names.tolist(), grid[cols].tolist(), *columns)
+
+
+def update_chunk(names: List[str], since: Dict[str, int], index_timestamps: np.ndarray,
+                 index_returns: np.ndarray) -> int:
+    """重算一批物品的Beta并写入结果表，返回写入的行数"""
+    # 第一个需要重算的窗口结束日所在的网格位置，往前多取 BETA_WINDOW 个网格日作为窗口
+    start = np.searchsorted(index_timestamps, min(since[name] for name in names))
+    lo = max(0, start - BETA_WINDOW)
+    grid = index_timestamps[lo:]
+    store = KlineStore.load(names, start=int(grid[0]), database_name=DATABASE_NAME, fields=('timestamp', 'close'))
+    if len(store) == 0:
+        return 0
+
+    item_returns = daily_returns(align_closes(store, grid), grid)
+    result = compute_betas(item_returns, index_returns[lo:])
+    first_column = np.searchsorted(grid, [since[name] for name in store.names])
+
+    with storage.transaction(DATABASE_NAME) as cursor:
+        cursor.executemany('DELETE FROM kline_beta WHERE market_hash_name = ? AND timestamp >= ?',
+                           [(name, since[name]) for name in names])
+        cursor.executemany(f'''
+        INSERT OR REPLACE INTO kline_beta (market_hash_name, timestamp, {', '.join(BETA_COLUMNS)})
+        VALUES ({', '.join('?' * (len(BETA_COLUMNS) + 2))})
+        ''', iter_beta_rows(store, grid, first_column, result))
+        return cursor.rowcount
+
+
+def update_betas(full: bool = False) -> int:
+    """
+    增量更新 kline_beta，返回写入的行数
+    只重算有新K线的物品从最早新K线开始的窗口；大盘指数有新增时所有物品重算新指数日之后的窗口。
+    物品按 CHUNK_ITEMS 分块读取和计算，内存占用与物品总数无关。
+    """
+    try:
+        create_tables()
+        started = time.perf_counter()
+        index_timestamps, index_values, index_target = load_index()
+        if len(index_timestamps) < 2:
+            print("⚠️ 大盘指数数据不足，跳过Beta计算")
+            return 0
+        index_returns = daily_returns(index_values, index_timestamps)
+
+        cursor = storage.get_connection(DATABASE_NAME).cursor()
+        # 先记下本次的目标水位线：计算过程中新写入的K线留到下一次处理
+        cursor.execute('SELECT COALESCE(MAX(id), 0) FROM kline_data')
+        kline_target = cursor.fetchone()[0]
+        kline_watermark = 0 if full else get_watermark(cursor, 'kline_data')
+        index_watermark = 0 if full else get_watermark(cursor, 'market_index')
+        index_since = index_changed_since(index_watermark)
+        since = plan_updates(cursor, kline_watermark, index_since)
+        if not since:
+            print("✅ 市场Beta已是最新")
+            return 0
+
+        names = sorted(since)
+        written = 0
+        for i in range(0, len(names), CHUNK_ITEMS):
+            written += update_chunk(names[i:i + CHUNK_ITEMS], since, index_timestamps, index_returns)
+
+        with storage.transaction(DATABASE_NAME) as cursor:
+            cursor.executemany('''
+            INSERT INTO kline_beta_watermark (name, watermark) VALUES (?, ?)
+            ON CONFLICT(name) DO UPDATE SET watermark = excluded.watermark
+            ''', [('kline_data', kline_target), ('market_index', index_target)])
+
+        print(f"✅ 已更新 {len(names)} 个物品的市场Beta，写入 {written} 行，耗时 {time.perf_counter() - started:.2f} 秒")
+        return written
+
+    except sqlite3.Error as e:
+        print(f"❌ 更新市场Beta失败: {e}")
+        return 0
+
+
+def latest_betas(limit: int = 20, order_by: str = 'beta') -> List[Tuple]:
+    """每个物品最近一个窗口的结果，按指定列从大到小排序"""
+    if order_by not in BETA_COLUMNS:
+        raise ValueError(f"order_by 必须是 {', '.join(BETA_COLUMNS)} 之一")
+    cursor = storage.get_connection(DATABASE_NAME).cursor()
+    cursor.execute(f'''
+    SELECT b.market_hash_name, b.timestamp, {', '.join(f'b.{column}' for column in BETA_COLUMNS)}
+    FROM kline_beta AS b
+    JOIN (SELECT market_hash_name, MAX(timestamp) AS timestamp FROM kline_beta GROUP BY market_hash_name) AS latest
+      ON latest.market_hash_name = b.market_hash_name AND latest.timestamp = b.timestamp
+    ORDER BY b.{order_by} DESC LIMIT ?
+    ''', (limit,))
+    return cursor.fetchall()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="计算物品相对大盘指数的滚动Beta、相关系数与残差波动率")
+    parser.add_argument('--full', action='store_true', help="忽略水位线，整体重算")
+    parser.add_argument('--top', type=int, default=20, help="显示最近窗口的前N个物品")
+    parser.add_argument('--order-by', choices=BETA_COLUMNS, default='beta', help="排序列")
+    args = parser.parse_args()
+
+    update_betas(args.full)
+    try:
+        for market_hash_name, timestamp, beta, correlation, residual_vol, observations in latest_betas(args.top, args.order_by):
+            correlation = '-' if correlation is None else f"{correlation:.3f}"
+            print(f"{market_hash_name:<60} beta={beta:>7.3f} corr={correlation:>6} "
+                  f"resid={residual_vol:.4f} n={observations}")
+    except sqlite3.Error as e:
+        print(f"❌ 查询市场Beta失败: {e}")
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+import argparse
+import sqlite3
+import time
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import storage
+from check_continuity import BEIJING_TZ, format_date
+from database_setup import DATABASE_NAME as PRICE_DATABASE, ensure_schema, read_latest_prices
+from time_utils import DAY_SECONDS
+
+PORTFOLIO_FILE = "portfolio.txt"
+KLINE_DATABASE = "kline.db"
+
+
+class Position(NamedTuple):
+    """portfolio.txt 中的一行持仓，buy_date 为买入日北京时间0点的时间戳"""
+    market_hash_name: str
+    buy_price: float
+    quantity: int
+    buy_date: int
+
+
+def parse_date(text: str) -> int:
+    """将 YYYY-MM-DD 解析为该日北京时间0点的时间戳"""
+    return int(datetime.strptime(text, "%Y-%m-%d").replace(tzinfo=BEIJING_TZ).timestamp())
+
+
+def read_portfolio(filepath: str = PORTFOLIO_FILE) -> List[Position]:
+    """
+    读取持仓文件，每行为 "商品名称,买入价格,数量,买入日期"，#开头的行为注释
+    商品名称中可能含有逗号，因此从右侧拆分；格式错误的行给出提示后跳过。
+    """
+    positions = []
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        print(f"❌ 错误：找不到持仓文件 '{filepath}'")
+        return positions
+
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            market_hash_name, buy_price, quantity, buy_date = (field.strip() for field in line.rsplit(',', 3))
+            positions.append(Position(market_hash_name, float(buy_price), int(quantity), parse_date(buy_date)))
+        except ValueError:
+            print(f"⚠️ 第 {line_number} 行格式错误，已跳过: {line}")
+    return positions
+
+
+class LatestPriceIndex:
+    """
+    内存中的"每个物品最新价格"索引：各平台最新的在售价/求购价，以及最新日K线收盘价
+    在售价/求购价读取自 latest_price 表，不扫描快照历史；收盘价首次读取全部，之后只读取水位线之后写入的K线。
+    """
+
+    def __init__(self, price_database: str = PRICE_DATABASE, kline_database: str = KLINE_DATABASE):
+        self.price_database = price_database
+        self.kline_database = kline_database
+        # {物品名称: {平台: (时间戳, 在售价, 求购价)}}，价格单位为元
+        self.quotes: Dict[str, Dict[str, Tuple[int, Optional[float], Optional[float]]]] = {}
+        # {物品名称: (时间戳, 收盘价)}
+        self.closes: Dict[str, Tuple[int, float]] = {}
+        self._snapshot_watermark = 0
+        self._kline_watermark = 0
+
+    def _refresh_quotes(self) -> int:
+        conn = storage.get_connection(self.price_database)
+        ensure_schema(conn)
+        # latest_price 每个饰品每个平台只有一行，水位线本身也包含在内，以便补上与上次读取同一时刻写入的快照
+        updated = 0
+        for market_hash_name, platform, timestamp, sell_price, _, bidding_price, _, _ in read_latest_prices(
+                conn.cursor(), since=self._snapshot_watermark):
+            platforms = self.quotes.setdefault(market_hash_name, {})
+            current = platforms.get(platform)
+            if current is None or timestamp > current[0]:
+                platforms[platform] = (timestamp,
+                                       None if sell_price is None else sell_price / 100,
+                                       None if bidding_price is None else bidding_price / 100)
+                updated += 1
+            self._snapshot_watermark = max(self._snapshot_watermark, timestamp)
+        return updated
+
+    def _refresh_closes(self) -> int:
+        cursor = storage.get_connection(self.kline_database).cursor()
+        cursor.execute('SELECT COALESCE(MAX(id), 0) FROM kline_data')
+        target = cursor.fetchone()[0]
+        cursor.execute('''
+        SELECT market_hash_name, MAX(timestamp), close_price FROM kline_data
+        WHERE id > ? AND id <= ?
+        GROUP BY market_hash_name
+        ''', (self._kline_watermark, target))
+        updated = 0
+        for market_hash_name, timestamp, close_price in cursor.fetchall():
+            current = self.closes.get(market_hash_name)
+            # 补采的历史K线不会覆盖更新的收盘价
+            if current is None or timestamp >= current[0]:
+                self.closes[market_hash_name] = (timestamp, close_price)
+                updated += 1
+        self._kline_watermark = target
+        return updated
+
+    def refresh(self) -> int:
+        """读取上次刷新之后的新价格，返回更新的条目数"""
+        return self._refresh_quotes() + self._refresh_closes()
+
+    def latest(self, market_hash_name: str) -> Tuple[Optional[float], Optional[float], Optional[float]]:
+        """返回 (各平台最低在售价, 各平台最高求购价, 最新收盘价)，没有数据的项为None"""
+        platforms = self.quotes.get(market_hash_name, {})
+        sell_prices = [sell for _, sell, _ in platforms.values() if sell is not None]
+        bidding_prices = [bid for _, _, bid in platforms.values() if bid is not None]
+        close = self.closes.get(market_hash_name)
+        return (min(sell_prices) if sell_prices else None,
+                max(bidding_prices) if bidding_prices else None,
+                close[1] if close else None)
+
+
+def value_positions(positions: List[Position], index: LatestPriceIndex) -> List[Tuple]:
+    """
+    按最新价格为每个持仓估值，返回 [(持仓, 估值价, 求购价, 成本, 市值, 盈亏)]
+    估值价优先使用各平台最低在售价，没有快照时使用最新收盘价，都没有时按买入价计。
+    """
+    valuations = []
+    for position in positions:
+        sell, bid, close = index.latest(position.market_hash_name)
+        mark = next((price for price in (sell, close) if price is not None), position.buy_price)
+        cost = position.buy_price * position.quantity
+        value = mark * position.quantity
+        valuations.append((position, mark, bid, cost, value, value - cost))
+    return valuations
+
+
+def mark_to_market_history(positions: List[Position], kline_database: str = KLINE_DATABASE) -> List[Tuple[int, float, float, float, float]]:
+    """
+    按日K线收盘价逐日估值，返回 [(日期时间戳, 成本, 市值, 盈亏, 回撤)]
+    从最早的买入日开始，每天只计入已买入的持仓；某天没有K线时沿用之前的收盘价，
+    买入后还没有K线的持仓按买入价计。回撤为当日盈亏与此前盈亏最高点之差（不大于0）。
+    """
+    if not positions:
+        return []
+    names = sorted({position.market_hash_name for position in positions})
+    start = min(position.buy_date for position in positions)
+    cursor = storage.get_connection(kline_database).cursor()
+    cursor.execute(f'''
+    SELECT timestamp, market_hash_name, close_price FROM kline_data
+    WHERE market_hash_name IN ({','.join('?' * len(names))}) AND timestamp >= ?
+    ORDER BY timestamp
+    ''', names + [start])
+    candles = cursor.fetchall()
+    if not candles:
+        return []
+
+    history = []
+    last_close: Dict[str, float] = {}
+    peak = None
+    i = 0
+    for day in range(start, candles[-1][0] + 1, DAY_SECONDS):
+        while i < len(candles) and candles[i][0] <= day:
+            last_close[candles[i][1]] = candles[i][2]
+            i += 1
+        cost = value = 0.0
+        for position in positions:
+            if position.buy_date <= day:
+                cost += position.buy_price * position.quantity
+                value += last_close.get(position.market_hash_name, position.buy_price) * position.quantity
+        pnl = value - cost
+        peak = pnl if peak is None else max(peak, pnl)
+        history.append((day, cost, value, pnl, pnl - peak))
+    return history
+
+
+def print_valuation(valuations: List[Tuple]):
+    """打印各持仓的估值与合计"""
+    total_cost = total_value = 0.0
+    for position, mark, bid, cost, value, pnl in valuations:
+        pnl_pct = pnl / cost * 100 if cost else 0.0
+        bid_text = '-' if bid is None else f"{bid:.2f}"
+        print(f"{position.market_hash_name:<50} x{position.quantity:<3} 成本 {cost:>10.2f} "
+              f"估值 {mark:>10.2f} 求购 {bid_text:>10} 市值 {value:>10.2f} 盈亏 {pnl:>+10.2f} ({pnl_pct:+.2f}%)")
+        total_cost += cost
+        total_value += value
+    total_pnl = total_value - total_cost
+    total_pct = total_pnl / total_cost * 100 if total_cost else 0.0
+    print(f"\n合计：成本 {total_cost:.2f}，市值 {total_value:.2f}，盈亏 {total_pnl:+.2f} ({total_pct:+.2f}%)")
+
+
+def print_history(history: List[Tuple], show_days: bool):
+    """打印逐日估值（可选）和最大回撤"""
+    if not history:
+        print("⚠️ 没有持仓物品的K线数据，无法生成逐日估值")
+        return
+    if show_days:
+        for day, cost, value, pnl, drawdown in history:
+            print(f"{format_date(day)} 成本 {cost:>10.2f} 市值 {value:>10.2f} 盈亏 {pnl:>+10.2f} 回撤 {drawdown:>10.2f}")
+    worst = min(history, key=lambda row: row[4])
+    print(f"📉 最大回撤 {worst[4]:.2f}（{format_date(worst[0])}）")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="持仓估值：盈亏、逐日估值与回撤")
+    parser.add_argument('--file', default=PORTFOLIO_FILE, help="持仓文件")
+    parser.add_argument('--history', action='store_true', help="打印逐日估值")
+    parser.add_argument('--watch', type=int, metavar='SECONDS', help="每隔指定秒数增量刷新价格并重新估值")
+    args = parser.parse_args()
+
+    positions = read_portfolio(args.file)
+    if not positions:
+        print("⚠️ 持仓文件中没有持仓")
+    else:
+        index = LatestPriceIndex()
+        try:
+            while True:
+                updated = index.refresh()
+                print(f"✅ 已刷新 {updated} 条最新价格")
+                print_valuation(value_positions(positions, index))
+                print_history(mark_to_market_history(positions), args.history)
+                if args.watch is None:
+                    break
+                time.sleep(args.watch)
+        except sqlite3.Error as e:
+            print(f"❌ 持仓估值失败: {e}")
+        except KeyboardInterrupt:
+            print("\n已停止")
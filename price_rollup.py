@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+import argparse
+import sqlite3
+import time
+from typing import Optional
+
+import storage
+from database_setup import DATABASE_NAME, ensure_schema
+from time_utils import BEIJING_OFFSET_SECONDS, DAY_SECONDS, beijing_midnight
+
+# 聚合粒度：表名 -> 周期秒数，桶边界按北京时间对齐
+ROLLUPS = {
+    'price_bars_hourly': 3600,
+    'price_bars_daily': DAY_SECONDS,
+}
+
+# 原始快照保留天数，超过且已完成聚合的快照会被删除；None 表示永久保留
+RAW_RETENTION_DAYS = None
+
+SQL_CREATE_BARS_TABLE = """
+CREATE TABLE IF NOT EXISTS {table} (
+    item_id INTEGER NOT NULL,
+    platform_id INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    sell_open INTEGER,
+    sell_high INTEGER,
+    sell_low INTEGER,
+    sell_close INTEGER,
+    bidding_open INTEGER,
+    bidding_high INTEGER,
+    bidding_low INTEGER,
+    bidding_close INTEGER,
+    sell_count_min INTEGER,
+    sell_count_max INTEGER,
+    sell_count_avg REAL,
+    bidding_count_min INTEGER,
+    bidding_count_max INTEGER,
+    bidding_count_avg REAL,
+    samples INTEGER NOT NULL,
+    PRIMARY KEY (item_id, platform_id, bucket)
+) WITHOUT ROWID
+"""
+
+# 重新计算 bucket >= 起始桶 的所有K线：
+# 窗口函数按时间正序/倒序编号，编号为1的行即为该桶的开盘/收盘快照
+SQL_ROLLUP = """
+INSERT OR REPLACE INTO {table}
+(item_id, platform_id, bucket,
+ sell_open, sell_high, sell_low, sell_close,
+ bidding_open, bidding_high, bidding_low, bidding_close,
+ sell_count_min, sell_count_max, sell_count_avg,
+ bidding_count_min, bidding_count_max, bidding_count_avg, samples)
+SELECT item_id, platform_id, bucket,
+       MAX(CASE WHEN first_rank = 1 THEN sell_price END), MAX(sell_price), MIN(sell_price),
+       MAX(CASE WHEN last_rank = 1 THEN sell_price END),
+       MAX(CASE WHEN first_rank = 1 THEN bidding_price END), MAX(bidding_price), MIN(bidding_price),
+       MAX(CASE WHEN last_rank = 1 THEN bidding_price END),
+       MIN(sell_count), MAX(sell_count), AVG(sell_count),
+       MIN(bidding_count), MAX(bidding_count), AVG(bidding_count),
+       COUNT(*)
+FROM (
+    SELECT item_id, platform_id, bucket, sell_price, bidding_price, sell_count, bidding_count,
+           ROW_NUMBER() OVER (PARTITION BY item_id, platform_id, bucket ORDER BY timestamp) AS first_rank,
+           ROW_NUMBER() OVER (PARTITION BY item_id, platform_id, bucket ORDER BY timestamp DESC) AS last_rank
+    FROM (
+        SELECT item_id, platform_id, timestamp - (timestamp + {offset}) % {period} AS bucket, timestamp,
+               sell_price, bidding_price, sell_count, bidding_count
+        FROM price_snapshots
+        WHERE timestamp >= ?
+    )
+)
+GROUP BY item_id, platform_id, bucket
+"""
+
+
+def create_tables(conn):
+    """创建聚合表、水位线表，以及增量聚合和清理所需的时间索引"""
+    ensure_schema(conn)
+    with storage.connection_transaction(conn) as cursor:
+        for table in ROLLUPS:
+            cursor.execute(SQL_CREATE_BARS_TABLE.format(table=table))
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rollup_state (
+            name TEXT PRIMARY KEY,
+            watermark INTEGER NOT NULL
+        )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_snapshots_time ON price_snapshots(timestamp)')
+
+
+def get_watermark(cursor, name: str) -> Optional[int]:
+    """读取某个聚合已处理到的最新快照时间戳"""
+    cursor.execute('SELECT watermark FROM rollup_state WHERE name = ?', (name,))
+    result = cursor.fetchone()
+    return result[0] if result else None
+
+
+def rollup(cursor, table: str, period: int) -> int:
+    """
+    增量聚合一个粒度，返回重新计算的K线数量
+    只处理时间戳不早于水位线的快照：从其中最早快照所在的桶开始整桶重算，
+    水位线本身也包含在内，以便补上与上次聚合同一时刻写入的快照。
+    """
+    watermark = get_watermark(cursor, table)
+    cursor.execute('SELECT MIN(timestamp), MAX(timestamp) FROM price_snapshots WHERE timestamp >= ?',
+                   (watermark if watermark is not None else 0,))
+    first_new, last_new = cursor.fetchone()
+    if first_new is None:
+        return 0
+
+    start_bucket = first_new - (first_new + BEIJING_OFFSET_SECONDS) % period
+    cursor.execute(SQL_ROLLUP.format(table=table, offset=BEIJING_OFFSET_SECONDS, period=period), (start_bucket,))
+    bars = cursor.rowcount
+    cursor.execute('''
+    INSERT INTO rollup_state (name, watermark) VALUES (?, ?)
+    ON CONFLICT(name) DO UPDATE SET watermark = excluded.watermark
+    ''', (table, last_new))
+    return bars
+
+
+def prune_raw_snapshots(cursor, retention_days: int) -> int:
+    """
+    删除超过保留期且已聚合完成的原始快照
+    只删除早于所有聚合水位线所在日的快照，保证之后的增量聚合不会用到被删除的数据。
+    """
+    watermarks = [get_watermark(cursor, table) for table in ROLLUPS]
+    if any(watermark is None for watermark in watermarks):
+        return 0
+    cutoff = min(int(time.time()) - retention_days * DAY_SECONDS, beijing_midnight(min(watermarks)))
+    cursor.execute('DELETE FROM price_snapshots WHERE timestamp < ?', (cutoff,))
+    return cursor.rowcount
+
+
+def run_rollups(retention_days: Optional[int] = RAW_RETENTION_DAYS, database_name: str = DATABASE_NAME):
+    """执行所有粒度的增量聚合，并按配置清理原始快照"""
+    if retention_days is not None and retention_days < 1:
+        raise ValueError("retention_days 必须不小于1")
+    try:
+        conn = storage.get_connection(database_name)
+        create_tables(conn)
+        with storage.connection_transaction(conn) as cursor:
+            for table, period in ROLLUPS.items():
+                bars = rollup(cursor, table, period)
+                print(f"✅ {table}: 更新了 {bars} 根K线")
+            if retention_days is not None:
+                pruned = prune_raw_snapshots(cursor, retention_days)
+                print(f"🧹 已清理 {pruned} 条超过 {retention_days} 天的原始快照")
+
+    except sqlite3.Error as e:
+        print(f"❌ 聚合价格快照失败: {e}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="将价格快照增量聚合为小时/日K线")
+    parser.add_argument('--retention-days', type=int, default=RAW_RETENTION_DAYS,
+                        help="原始快照保留天数，默认永久保留")
+    args = parser.parse_args()
+    run_rollups(args.retention_days)
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from typing import Callable, Tuple
+
+
+class RateLimiter:
+    """
+    线程安全的令牌桶限速器，供所有并发采集线程共享。
+    rate 为每秒补充的令牌数（即允许的请求/秒），capacity 为桶容量（允许的突发请求数）。
+    capacity 为 1 时请求严格按 1/rate 秒的间隔发出，任意时间窗口内都不会超出配额。
+    """
+
+    def __init__(self, rate: float, capacity: int = 1):
+        if rate <= 0:
+            raise ValueError("rate 必须大于0")
+        if capacity < 1:
+            raise ValueError("capacity 必须不小于1")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+        self.acquired = 0
+
+    def _refill(self, now: float):
+        """按流逝时间补充令牌（需在持有锁时调用）"""
+        elapsed = now - self._last_refill
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._last_refill = now
+
+    def acquire(self):
+        """获取一个令牌，令牌不足时阻塞等待"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    self.acquired += 1
+                    return
+                wait_time = (1 - self._tokens) / self.rate
+            time.sleep(wait_time)
+
+
+class RunStats:
+    """
+    记录一次采集运行的耗时，用于输出实际达到的请求速率
+    counts 返回累计的 (实际发出的网络请求数, 缓存命中数)，统计的是本次运行期间的增量。
+    """
+
+    def __init__(self, counts: Callable[[], Tuple[int, int]]):
+        self._counts = counts
+        self._baseline = counts()
+        self._start = time.monotonic()
+
+    @property
+    def requests(self) -> int:
+        return self._counts()[0] - self._baseline[0]
+
+    @property
+    def cache_hits(self) -> int:
+        return self._counts()[1] - self._baseline[1]
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self._start
+
+    def summary(self) -> str:
+        elapsed = self.elapsed
+        requests = self.requests
+        rps = requests / elapsed if elapsed > 0 else 0.0
+        return (f"共发出 {requests} 个网络请求（含重试），缓存命中 {self.cache_hits} 次，"
+                f"总耗时 {elapsed:.1f} 秒，平均 {rps:.2f} 请求/秒")
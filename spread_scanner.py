@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+import argparse
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# 各平台卖出手续费率（占成交价的比例），请按实际费率修改；
+# 也可以在 config.py 中定义 PLATFORM_FEES 覆盖其中的部分平台
+PLATFORM_FEES = {
+    'BUFF': 0.025,
+    'YOUPIN': 0.01,
+    'C5': 0.01,
+    'IGXE': 0.025,
+    'HALOSKINS': 0.02,
+    'STEAM': 0.13,
+}
+# 未列出的平台使用的手续费率
+DEFAULT_FEE = 0.02
+
+try:
+    from config import PLATFORM_FEES as CONFIG_PLATFORM_FEES
+    PLATFORM_FEES.update(CONFIG_PLATFORM_FEES)
+except ImportError:
+    pass
+
+# 默认显示的机会数量与最低净收益率
+TOP_OPPORTUNITIES = 20
+MIN_RETURN = 0.0
+
+
+class QuoteMatrix:
+    """
+    所有物品在所有平台的报价：第 i 个物品在第 j 个平台的在售价/求购价位于 [i, j]
+    平台没有报价（缺失、价格为0）时价格为NaN、数量为0。
+    """
+
+    def __init__(self, names: List[str], platforms: List[str], sell: np.ndarray, sell_count: np.ndarray,
+                 bid: np.ndarray, bid_count: np.ndarray):
+        self.names = names
+        self.platforms = platforms
+        self.sell = sell
+        self.sell_count = sell_count
+        self.bid = bid
+        self.bid_count = bid_count
+
+    @classmethod
+    def from_price_data(cls, price_data: list) -> 'QuoteMatrix':
+        """由 /price/batch 的返回结果构建，保留 dataList 中的所有平台"""
+        names = []
+        platform_index: Dict[str, int] = {}
+        cells = []
+        for i, item_data in enumerate(price_data):
+            names.append(item_data.get("marketHashName"))
+            for platform_data in item_data.get("dataList") or []:
+                platform = platform_data.get("platform")
+                j = platform_index.setdefault(platform, len(platform_index))
+                cells.append((i, j,
+                              platform_data.get("sellPrice") or 0, platform_data.get("sellCount") or 0,
+                              platform_data.get("biddingPrice") or 0, platform_data.get("biddingCount") or 0))
+
+        cells = np.array(cells, dtype=np.float64).reshape(-1, 6)
+        shape = (len(names), len(platform_index))
+        rows, cols = cells[:, 0].astype(np.int64), cells[:, 1].astype(np.int64)
+        matrices = []
+        for column in range(2, 6):
+            matrix = np.zeros(shape)
+            matrix[rows, cols] = cells[:, column]
+            matrices.append(matrix)
+        sell, sell_count, bid, bid_count = matrices
+        sell[sell <= 0] = np.nan
+        bid[bid <= 0] = np.nan
+        return cls(names, list(platform_index), sell, sell_count, bid, bid_count)
+
+
+def platform_fees(platforms: List[str], fees: Optional[Dict[str, float]] = None) -> np.ndarray:
+    """按平台顺序返回手续费率数组"""
+    fees = PLATFORM_FEES if fees is None else {**PLATFORM_FEES, **fees}
+    return np.array([fees.get(platform, DEFAULT_FEE) for platform in platforms])
+
+
+def best_spreads(quotes: QuoteMatrix, fees: Optional[Dict[str, float]] = None) -> Dict[str, np.ndarray]:
+    """
+    一次向量化计算每个物品的最佳跨平台价差
+    在平台 A 以在售价买入、在平台 B 以求购价卖出（A != B），净收益 = B求购价 * (1 - B手续费) - A在售价；
+    只考虑 A 有在售、B 有求购的组合。返回 {'buy': A序号, 'sell': B序号, 'profit': 净收益, 'return': 净收益率}，
+    没有可行组合的物品 profit 为NaN。
+    """
+    net_bid = quotes.bid * (1.0 - platform_fees(quotes.platforms, fees))
+    net_bid[quotes.bid_count <= 0] = np.nan
+    sell = np.where(quotes.sell_count > 0, quotes.sell, np.nan)
+
+    # profit[i, a, b]：物品 i 在平台 a 买入、平台 b 卖出
+    profit = net_bid[:, None, :] - sell[:, :, None]
+    platform_count = len(quotes.platforms)
+    profit[:, np.arange(platform_count), np.arange(platform_count)] = np.nan
+
+    flat = profit.reshape(len(quotes.names), -1)
+    feasible = ~np.isnan(flat).all(axis=1)
+    best = np.argmax(np.where(np.isnan(flat), -np.inf, flat), axis=1)
+    best_profit = np.where(feasible, flat[np.arange(len(flat)), best], np.nan)
+    buy, sell_at = np.divmod(best, max(platform_count, 1))
+    with np.errstate(invalid='ignore'):
+        best_return = best_profit / sell[np.arange(len(flat)), buy]
+    return {'buy': buy, 'sell': sell_at, 'profit': best_profit, 'return': best_return}
+
+
+def rank_opportunities(quotes: QuoteMatrix, spreads: Dict[str, np.ndarray], top: int = TOP_OPPORTUNITIES,
+                       min_return: float = MIN_RETURN) -> List[Tuple[str, str, float, str, float, float, float]]:
+    """
+    按净收益率从高到低排列价差机会
+    返回 [(物品名称, 买入平台, 买入价, 卖出平台, 卖出求购价, 净收益, 净收益率)]
+    """
+    with np.errstate(invalid='ignore'):
+        candidates = np.nonzero(spreads['return'] > min_return)[0]
+    order = candidates[np.argsort(-spreads['return'][candidates], kind='stable')][:top]
+    opportunities = []
+    for i in order.tolist():
+        buy, sell = spreads['buy'][i], spreads['sell'][i]
+        opportunities.append((quotes.names[i], quotes.platforms[buy], float(quotes.sell[i, buy]),
+                              quotes.platforms[sell], float(quotes.bid[i, sell]),
+                              float(spreads['profit'][i]), float(spreads['return'][i])))
+    return opportunities
+
+
+def scan(price_data: list, fees: Optional[Dict[str, float]] = None, top: int = TOP_OPPORTUNITIES,
+         min_return: float = MIN_RETURN) -> List[Tuple]:
+    """对一次批量价格查询的结果进行扫描，返回排序后的价差机会"""
+    if not price_data:
+        return []
+    quotes = QuoteMatrix.from_price_data(price_data)
+    if not quotes.platforms:
+        return []
+    return rank_opportunities(quotes, best_spreads(quotes, fees), top, min_return)
+
+
+def print_opportunities(opportunities: List[Tuple]):
+    """打印价差机会"""
+    if not opportunities:
+        print("ℹ️  没有扣除手续费后仍有收益的跨平台价差")
+        return
+    for name, buy_platform, buy_price, sell_platform, sell_price, profit, net_return in opportunities:
+        print(f"{name:<50} {buy_platform:>9} 买 {buy_price:>10.2f} → {sell_platform:>9} 卖 {sell_price:>10.2f} "
+              f"净赚 {profit:>9.2f} ({net_return:+.2%})")
+
+
+def parse_fee(text: str) -> Tuple[str, float]:
+    """解析命令行中的 平台=费率"""
+    platform, _, rate = text.partition('=')
+    try:
+        return platform, float(rate)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"手续费格式应为 平台=费率，例如 BUFF=0.025: {text}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="扫描跨平台价差：在一个平台买入，在另一个平台卖给求购")
+    parser.add_argument('--file', help="已保存的 /price/batch 返回结果（JSON），不指定时查询关注列表的实时价格")
+    parser.add_argument('--fee', type=parse_fee, action='append', default=[], metavar='PLATFORM=RATE',
+                        help="覆盖某个平台的手续费率，可重复")
+    parser.add_argument('--top', type=int, default=TOP_OPPORTUNITIES, help="显示的机会数量")
+    parser.add_argument('--min-return', type=float, default=MIN_RETURN, help="最低净收益率，例如 0.02 表示2%%")
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        price_data = data.get('data') if isinstance(data, dict) else data
+    else:
+        import get_prices
+        price_data = get_prices.get_prices_batch(get_prices.read_watchlist(get_prices.WATCHLIST_FILE))
+
+    if price_data:
+        started = time.perf_counter()
+        opportunities = scan(price_data, dict(args.fee), args.top, args.min_return)
+        print(f"✅ 已扫描 {len(price_data)} 个物品，耗时 {time.perf_counter() - started:.3f} 秒")
+        print_opportunities(opportunities)
+    else:
+        print("❌ 没有可扫描的价格数据")
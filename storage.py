@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import atexit
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# 每个新连接都会执行的PRAGMA设置
+# WAL 允许读写并发，synchronous=NORMAL 在WAL模式下只在检查点时fsync，
+# mmap_size / cache_size 让常用页面留在内存中，减少系统调用
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA mmap_size=268435456",  # 256MB
+    "PRAGMA cache_size=-65536",  # 64MB
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+# 每个线程为每个数据库文件保留一个长连接
+_local = threading.local()
+_all_connections = []
+_registry_lock = threading.Lock()
+
+
+def _open_connection(database_name: str) -> sqlite3.Connection:
+    """打开一个新连接并应用PRAGMA设置"""
+    # check_same_thread=False 仅用于程序退出时统一关闭，连接本身只在创建它的线程中使用
+    conn = sqlite3.connect(database_name, check_same_thread=False)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    with _registry_lock:
+        _all_connections.append(conn)
+    return conn
+
+
+def get_connection(database_name: str) -> sqlite3.Connection:
+    """获取当前线程到指定数据库的长连接，首次调用时创建"""
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    conn = connections.get(database_name)
+    if conn is None:
+        conn = connections[database_name] = _open_connection(database_name)
+    return conn
+
+
+def transaction(database_name: str):
+    """
+    在一个事务中执行数据库操作，返回游标
+    正常结束时提交，发生异常时回滚并继续抛出异常。
+    """
+    return connection_transaction(get_connection(database_name))
+
+
+@contextmanager
+def connection_transaction(conn: sqlite3.Connection):
+    """与 transaction 相同，但使用调用方传入的连接"""
+    cursor = conn.cursor()
+    try:
+        yield cursor
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def get_schema_version(cursor) -> int:
+    """读取数据库文件头中的 user_version，用作迁移版本号"""
+    cursor.execute("PRAGMA user_version")
+    return cursor.fetchone()[0]
+
+
+def set_schema_version(cursor, version: int):
+    """写入迁移版本号，与同一事务中的迁移语句一起提交"""
+    cursor.execute(f"PRAGMA user_version = {int(version)}")
+
+
+def close_all():
+    """关闭所有线程打开的连接"""
+    with _registry_lock:
+        connections = list(_all_connections)
+        _all_connections.clear()
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+    _local.__dict__.clear()
+
+
+atexit.register(close_all)
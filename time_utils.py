@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+import time
+
+DAY_SECONDS = 86400
+BEIJING_OFFSET_SECONDS = 8 * 3600  # 北京时间 = UTC+8
+
+
+def adjust_to_beijing_midnight(timestamp_ms: int) -> int:
+    """
+    将毫秒时间戳调整为最近的过去北京时间24点（午夜0点）
+    纯整数运算：北京时间当天已过去的秒数为 (t + 8h) mod 1天，减去即为当天0点。
+    """
+    timestamp_sec = timestamp_ms // 1000
+    return (timestamp_sec - (timestamp_sec + BEIJING_OFFSET_SECONDS) % DAY_SECONDS) * 1000
+
+
+def beijing_midnight(timestamp_sec: int) -> int:
+    """秒级版本的 adjust_to_beijing_midnight"""
+    return timestamp_sec - (timestamp_sec + BEIJING_OFFSET_SECONDS) % DAY_SECONDS
+
+
+def to_milliseconds(timestamp_raw) -> int:
+    """API返回的时间戳可能是秒级或毫秒级：小于3000000000的视为秒级并转换为毫秒级"""
+    timestamp_int = int(timestamp_raw)
+    return timestamp_int * 1000 if timestamp_int < 3000000000 else timestamp_int
+
+
+def now_ms() -> int:
+    """当前时间的毫秒时间戳"""
+    return time.time_ns() // 1_000_000